@@ -2,16 +2,57 @@
 
 import os
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from api.modules.assets import asset_url
 
 webTitle = "ARKWRN"
 debugStatus = "True"
 current_year = datetime.now().year
 project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 frontendDirectory=os.path.join(project_dir, 'frontend')
-dashboardPages = Jinja2Templates(os.path.join(frontendDirectory, 'dashboard'))
-authPages = Jinja2Templates(os.path.join(frontendDirectory, 'dashboard', 'auth'))
+
+# Compiled templates are kept on disk so restarts and new workers skip parsing
+templateCacheDirectory = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(project_dir, '.jinja_cache'))
+# Maximum number of template directories (one Jinja environment each) kept alive
+TEMPLATE_ENV_LIMIT = int(os.getenv("TEMPLATE_ENV_LIMIT", "32"))
+
+os.makedirs(templateCacheDirectory, exist_ok=True)
+_bytecode_cache = FileSystemBytecodeCache(templateCacheDirectory)
+_template_registry = OrderedDict()
+
+def get_templates(directory: str) -> Jinja2Templates:
+    """Returns the shared Jinja2Templates for a directory, creating it on first use."""
+    key = os.path.realpath(directory)
+    templates = _template_registry.get(key)
+    if templates is None:
+        templates = Jinja2Templates(directory=key, bytecode_cache=_bytecode_cache)
+        templates.env.globals["asset_url"] = asset_url
+        _template_registry[key] = templates
+        while len(_template_registry) > TEMPLATE_ENV_LIMIT:
+            _template_registry.popitem(last=False)
+    else:
+        _template_registry.move_to_end(key)
+    return templates
+
+dashboardPages = get_templates(os.path.join(frontendDirectory, 'dashboard'))
+authPages = get_templates(os.path.join(frontendDirectory, 'dashboard', 'auth'))
+
+def precompile_templates(directory: str = os.path.join(frontendDirectory, 'dashboard')) -> int:
+    """Compiles every .html template under `directory` into its environment and the bytecode cache."""
+    count = 0
+    for root, _, files in os.walk(directory):
+        templates = get_templates(root)
+        for name in files:
+            if name.endswith(".html"):
+                try:
+                    templates.get_template(name)
+                    count += 1
+                except Exception as e:
+                    logging.error(f"Failed to compile template {os.path.join(root, name)}: {e}")
+    return count
 
 def setup_logging():
     logging.basicConfig(level=logging.ERROR)
@@ -1,11 +1,28 @@
+import os
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from api.routes import admin_ui
+from fastapi.concurrency import run_in_threadpool
+from api.config import precompile_templates
+from api.modules.assets import PrecompressedStaticFiles
+from api.routes import admin_ui, media_files
+from api.routes.compression import CompressionMiddleware
 
 app = FastAPI()
 
-# Static files (CSS, JS, images)
-app.mount("/static", StaticFiles(directory="frontend/assets"), name="static")
+# gzip/brotli for HTML and JSON responses; static assets use their prebuilt sidecars
+app.add_middleware(CompressionMiddleware)
+
+# Compile every dashboard template before the first request (PRECOMPILE_TEMPLATES=true)
+@app.on_event("startup")
+async def warm_templates():
+    if os.getenv("PRECOMPILE_TEMPLATES", "false").lower() == "true":
+        await run_in_threadpool(precompile_templates)
+
+# Static files (CSS, JS, images); run `python -m api.modules.assets` at build time
+# for fingerprinted names and precompressed sidecars
+app.mount("/static", PrecompressedStaticFiles(directory="frontend/assets"), name="static")
 
 # Admin dashboard routes
 app.include_router(admin_ui.router)
+
+# Uploaded shop and offer media (media/...), with byte ranges and ETags
+app.include_router(media_files.router)
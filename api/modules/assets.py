@@ -0,0 +1,206 @@
+# File: api/modules/assets.py
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+
+import anyio
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz sidecars are built and served
+    brotli = None
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+ASSET_DIR = os.getenv("ASSET_DIR", os.path.join(project_dir, 'frontend', 'assets'))
+ASSET_URL_PREFIX = os.getenv("ASSET_URL_PREFIX", "/static")
+MANIFEST_NAME = "manifest.json"
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".map", ".txt", ".ico", ".html", ".ts", ".md"}
+MIN_COMPRESS_BYTES = 1024
+HASH_LENGTH = 10
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = f"public, max-age={int(os.getenv('ASSET_MAX_AGE', '3600'))}"
+
+
+def hashed_name(rel_path: str, digest: str) -> str:
+    """css/core/libs.min.css -> css/core/libs.min.<hash>.css"""
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def _name_hash(hashed: str) -> str:
+    """css/core/libs.min.<hash>.css -> <hash>"""
+    return os.path.splitext(hashed)[0].rsplit(".", 1)[-1]
+
+
+def _file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _write_sidecar(path: str, data: bytes, suffix: str, packed: bytes):
+    # Keep a sidecar only when it actually saves bytes
+    target = path + suffix
+    if len(packed) < len(data):
+        with open(target, "wb") as f:
+            f.write(packed)
+        return True
+    if os.path.exists(target):
+        os.remove(target)
+    return False
+
+
+def build_assets(directory: str = ASSET_DIR) -> dict:
+    """
+    Fingerprints every asset and writes precompressed sidecars next to it.
+
+    The manifest maps each original path to its content-hashed name; the
+    hashed name is served from the original file, so nothing is copied.
+    Compressible files get `.gz` (and `.br` when brotli is installed).
+    Returns counts for the build log.
+    """
+    manifest, report = {}, {"files": 0, "gzip": 0, "brotli": 0}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith((".gz", ".br")) or name == MANIFEST_NAME:
+                continue
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, directory).replace(os.sep, "/")
+            with open(full, "rb") as f:
+                data = f.read()
+
+            manifest[rel] = hashed_name(rel, hashlib.sha256(data).hexdigest())
+            report["files"] += 1
+
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE or len(data) < MIN_COMPRESS_BYTES:
+                continue
+            if _write_sidecar(full, data, ".gz", gzip.compress(data, compresslevel=9, mtime=0)):
+                report["gzip"] += 1
+            if brotli is not None and _write_sidecar(full, data, ".br", brotli.compress(data, quality=11)):
+                report["brotli"] += 1
+
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return report
+
+
+_manifest = None
+
+def load_manifest(directory: str = ASSET_DIR) -> dict:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME)) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(path: str) -> str:
+    """Template global: `{{ asset_url('css/hope-ui.min.css') }}` -> the fingerprinted URL, if built."""
+    path = path.lstrip("/")
+    return f"{ASSET_URL_PREFIX}/{load_manifest().get(path, path)}"
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves `.br`/`.gz` sidecars to clients that accept them.
+
+    Fingerprinted names from the manifest resolve to the original file and are
+    cached as immutable while the file still has that hash; once it has been
+    edited without a rebuild it is served with the short max-age instead. A
+    sidecar older than its original is stale and skipped, so the original is
+    sent uncompressed (or compressed by the middleware) until the next build.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._originals = {v: k for k, v in load_manifest(str(self.directory)).items()}
+        # full path -> (mtime_ns, size, sha256), so unchanged files are hashed once
+        self._digests = {}
+
+    def _hash_matches(self, path: str, hashed: str) -> bool:
+        full_path, stat_result = self.lookup_path(path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            return False
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        cached = self._digests.get(full_path)
+        if cached is None or cached[:2] != key:
+            cached = (*key, _file_digest(full_path))
+            self._digests[full_path] = cached
+        return cached[2].startswith(_name_hash(hashed))
+
+    async def _sidecar_response(self, path, media_type, scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if not accepted & {"br", "gzip"}:
+            return None
+        _, original_stat = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if not original_stat:
+            return None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if (stat_result and stat.S_ISREG(stat_result.st_mode)
+                    and stat_result.st_mtime_ns >= original_stat.st_mtime_ns):
+                response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+                response.headers["content-encoding"] = encoding
+                return response
+        return None
+
+    async def get_response(self, path: str, scope):
+        key = path.replace(os.sep, "/")
+        original = self._originals.get(key)
+        immutable = False
+        if original is not None:
+            path = original.replace("/", os.sep)
+            immutable = await anyio.to_thread.run_sync(self._hash_matches, path, key)
+
+        response = None
+        if os.path.splitext(path)[1].lower() in COMPRESSIBLE and scope["method"] in ("GET", "HEAD"):
+            media_type = mimetypes.guess_type(path)[0] or "text/plain"
+            response = await self._sidecar_response(path, media_type, scope)
+            if response is not None and self.is_not_modified(response.headers, Headers(scope=scope)):
+                response = NotModifiedResponse(response.headers)
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304):
+            response.headers["cache-control"] = IMMUTABLE_CACHE if immutable else DEFAULT_CACHE
+            if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+                response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    result = build_assets()
+    print(f"{result['files']} assets fingerprinted, {result['gzip']} .gz and {result['brotli']} .br sidecars written"
+          + ("" if brotli else " (install brotli for .br)"))
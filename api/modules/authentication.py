@@ -1,7 +1,7 @@
 # File: api/modules/authentication.py
 
 from starlette.requests import Request
-from .db import get_user_by_email
+from .user_cache import get_cached_user
 from ..config import setup_logging
 
 # Initialize logging
@@ -13,13 +13,13 @@ def get_current_user(request: Request):
         return None  # User is not authenticated
     return email  # Return the authenticated user
 
-# Update to async function to await get_user_by_email
+# Served from the user cache, so page renders do not query the database
 async def get_user_name(request: Request):
     email = request.session.get("user_email")
     if email is None:
         return None  # User is not authenticated
 
-    user = await get_user_by_email(email)  # Awaiting the asynchronous function
+    user = await get_cached_user(email)
     if user is None:
         return None  # User data could not be found, consider this as not authenticated
 
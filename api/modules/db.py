@@ -57,6 +57,9 @@ async def get_user_by_email(email: str):
         document["_id"] = str(document["_id"])
     return document
 
+async def update_user_password(email: str, hashed_password: str):
+    await collection_users.update_one({"email": email}, {"$set": {"password": hashed_password}})
+
 async def get_user_count():
     try:
         count = await collection_users.count_documents({})
@@ -0,0 +1,108 @@
+# File: api/modules/page_cache.py
+
+import hashlib
+import os
+from collections import OrderedDict
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import TemplateNotFound, meta
+from starlette.requests import Request
+from starlette.responses import Response
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+
+# Globals whose output never depends on the request (Jinja's own helpers and asset_url)
+_PURE_GLOBALS = {"range", "dict", "lipsum", "cycler", "joiner", "namespace", "asset_url"}
+
+def _template_files(templates: Jinja2Templates, name: str, names: set):
+    """
+    Returns (files, static) for `name`: the files read while checking it
+    (itself plus includes/extends) and whether none of them references
+    anything outside `names`, such as `request`, `url_for` or a value only
+    known at render time. Files is None when a template is missing.
+    """
+    env = templates.env
+    files, pending, seen = [], [name], set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            source, filename, _ = env.loader.get_source(env, current)
+        except TemplateNotFound:
+            return None, False
+        files.append(filename)
+        ast = env.parse(source)
+        if not meta.find_undeclared_variables(ast) <= names | _PURE_GLOBALS:
+            return files, False
+        for child in meta.find_referenced_templates(ast):
+            if child is None:
+                return files, False
+            pending.append(child)
+    return files, True
+
+def _signature(files):
+    try:
+        return tuple(os.stat(f).st_mtime_ns for f in files)
+    except OSError:
+        return None
+
+class PageCache:
+    """
+    Rendered HTML of pages whose output depends only on the values passed in
+    (e.g. the title), never on the request.
+
+    A page is checked once with `jinja2.meta` and re-checked whenever one of
+    its template files changes on disk. Cached pages carry an ETag, and a
+    matching `If-None-Match` is answered with 304 without rendering. Other
+    pages are rendered normally.
+    """
+
+    def __init__(self, maxsize=PAGE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def _entry(self, templates, name, context):
+        values = {k: v for k, v in context.items() if k != "request"}
+        key = (templates.env.loader.searchpath[0], name, tuple(sorted(values.items())))
+
+        entry = self._entries.get(key)
+        if entry is not None and entry["signature"] == _signature(entry["files"]):
+            self._entries.move_to_end(key)
+            return entry
+
+        files, static = _template_files(templates, name, set(values))
+        if files is None:
+            return None
+
+        # Request-dependent pages are remembered too, so they are not re-parsed
+        body = templates.get_template(name).render(context).encode("utf-8") if static else None
+        entry = {
+            "files": files,
+            "signature": _signature(files),
+            "body": body,
+            "etag": f'"{hashlib.sha1(body).hexdigest()[:20]}"' if static else None
+        }
+        self._entries[key] = entry
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def response(self, request: Request, templates: Jinja2Templates, name: str, context: dict):
+        entry = self._entry(templates, name, context)
+        if entry is None or entry["body"] is None:
+            return templates.TemplateResponse(name, context)
+
+        # Pages sit behind a login, so browsers may keep them but shared caches may not
+        headers = {"ETag": entry["etag"], "Cache-Control": "private, no-cache"}
+        # Weak comparison: the compression middleware marks ETags as W/ when it encodes
+        candidates = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+        if entry["etag"] in candidates:
+            return Response(status_code=304, headers=headers)
+        return Response(entry["body"], media_type="text/html", headers=headers)
+
+page_cache = PageCache()
+
+def render_page(request: Request, templates: Jinja2Templates, name: str, context: dict):
+    return page_cache.response(request, templates, name, context)
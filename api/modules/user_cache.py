@@ -0,0 +1,91 @@
+# File: api/modules/user_cache.py
+
+import asyncio
+import copy
+import os
+import time
+from collections import OrderedDict
+
+from .db import get_user_by_email
+
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+
+class UserCache:
+    """
+    LRU + TTL cache of user documents keyed by email.
+
+    Concurrent misses for the same email share one `find_one` (single flight).
+    `invalidate` also forgets a load already in flight: later callers start a
+    fresh one, and the old result is not stored. Callers get their own copy
+    of the document, so popping fields such as `password` does not touch the
+    cached entry. Registration and any change to a user document must call
+    `invalidate(email)`.
+    """
+
+    def __init__(self, loader, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE):
+        self.loader = loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    async def _load(self, email):
+        task = asyncio.current_task()
+        try:
+            doc = await self.loader(email)
+            # Skip storing if the user was invalidated while the query ran
+            if doc is not None and self._inflight.get(email) is task:
+                self._entries[email] = (time.monotonic() + self.ttl, doc)
+                self._entries.move_to_end(email)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return doc
+        finally:
+            if self._inflight.get(email) is task:
+                del self._inflight[email]
+
+    async def get(self, email):
+        entry = self._entries.get(email)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(email)
+            return copy.deepcopy(entry[1])
+
+        self.misses += 1
+        task = self._inflight.get(email)
+        if task is None:
+            task = asyncio.ensure_future(self._load(email))
+            self._inflight[email] = task
+        doc = await asyncio.shield(task)
+        return copy.deepcopy(doc)
+
+    def invalidate(self, email=None):
+        if email is None:
+            self._entries.clear()
+            self._inflight.clear()
+            return
+        self._entries.pop(email, None)
+        self._inflight.pop(email, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "inflight": len(self._inflight)
+        }
+
+
+user_cache = UserCache(get_user_by_email)
+
+async def get_cached_user(email: str):
+    return await user_cache.get(email)
+
+def invalidate_user(email: str = None):
+    user_cache.invalidate(email)
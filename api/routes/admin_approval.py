@@ -1,66 +1,130 @@
 # admin_approval.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from bson import ObjectId
-from common_urldb import db
+from datetime import datetime
+from typing import Optional
+from common_urldb import db, ensure_index
+from ref_cache import city_cache, category_cache
+from shop_view import refresh_shop
+from json_response import BSONJSONResponse
 
 router = APIRouter()
 
 col_shop = db["shop"]
-col_category = db["category"]
-col_city = db["city"]
-def oid(x):
-    return str(x) if isinstance(x, ObjectId) else x
 
-@router.get("/pending_shops/")
-def pending_shops():
-    shops = []
-
-    cursor = col_shop.find({"status": "pending"})
-
-    for s in cursor:
-
-        # CLEAN BASE SHOP DOC
-        s_clean = {k: oid(v) for k, v in s.items()}
-
-        # ---------------------------
-        # CATEGORY DETAILS
-        # ---------------------------
-        categories = []
-        for cid in s.get("category", []):   # category = list of IDs
-            try:
-                c = col_category.find_one({"_id": ObjectId(cid)})
-                if c:
-                    categories.append({
-                        "_id": oid(c["_id"]),
-                        "name": c.get("name")
-                    })
-            except:
-                pass
-
-        s_clean["categories"] = categories  # add to final output
+ensure_index("shop", [("status", 1), ("created_at", 1), ("_id", 1)])
+
+MAX_PAGE_SIZE = 200
+
+# Only what the moderation table shows, plus the references to hydrate
+PENDING_SHOP_FIELDS = {
+    "shop_name": 1,
+    "email": 1,
+    "phone_number": 1,
+    "address": 1,
+    "keywords": 1,
+    "category": 1,
+    "city_id": 1,
+    "created_at": 1,
+    "main_thumb": 1,
+}
+
+
+def _to_oid(value):
+    if value and ObjectId.is_valid(str(value)):
+        return ObjectId(str(value))
+    return None
+
+
+def encode_cursor(s):
+    created = s.get("created_at")
+    return f"{created.isoformat() if isinstance(created, datetime) else ''}|{s['_id']}"
+
+
+def decode_cursor(cursor):
+    """Turns `<created_at iso>|<shop id>` into a query for the shops after it."""
+    created_raw, _, sid = cursor.partition("|")
+    if not ObjectId.is_valid(sid):
+        raise ValueError("Invalid cursor")
+    created = datetime.fromisoformat(created_raw) if created_raw else None
+    # Shops without created_at sort first, so every dated shop comes after them
+    later = {"$ne": None} if created is None else {"$gt": created}
+    return {"$or": [
+        {"created_at": later},
+        {"created_at": created, "_id": {"$gt": ObjectId(sid)}}
+    ]}
+
+
+async def hydrate_pending_shops(shops):
+    """
+    Attaches city and category details to a page of shops.
+
+    Ids are collected across the whole page and resolved through the
+    reference caches, which cost at most one `$in` query per collection.
+    """
+    city_ids, cat_ids = set(), set()
+    for s in shops:
+        if _to_oid(s.get("city_id")):
+            city_ids.add(_to_oid(s.get("city_id")))
+        cat_ids.update(filter(None, (_to_oid(c) for c in s.get("category", []))))
+
+    cities = await city_cache.get_many(city_ids)
+    categories = await category_cache.get_many(cat_ids)
+
+    result = []
+    for s in shops:
+        # BASE SHOP DOC (ObjectIds are encoded by BSONJSONResponse)
+        s_clean = dict(s)
+        s_clean["thumb_url"] = s_clean.pop("main_thumb", None)
+
+        # CATEGORY DETAILS (in the shop's own order)
+        s_clean["categories"] = [
+            {"_id": c["_id"], "name": c.get("name")}
+            for c in (categories.get(_to_oid(cid)) for cid in s.get("category", []))
+            if c
+        ]
+
         # CITY DETAILS
-        city_doc = None
-        if s.get("city_id"):
-            try:
-                city = col_city.find_one({"_id": ObjectId(s["city_id"])})
-                if city:
-                    city_doc = {
-                        "_id": oid(city["_id"]),
-                        "name": city.get("city_name")
-                    }
-            except:
-                city_doc = None
+        city = cities.get(_to_oid(s.get("city_id")))
+        s_clean["city"] = {"_id": city["_id"], "name": city.get("city_name")} if city else None
 
-        s_clean["city"] = city_doc  # add city to final output
+        result.append(s_clean)
+    return result
 
-        # ADD TO LIST
-        shops.append(s_clean)
 
-    return {"status": True, "data": shops}
+@router.get("/pending_shops/")
+async def pending_shops(
+        cursor: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Lists pending shops oldest first.
+
+    Pass `limit` to page through them; each response then carries
+    `next_cursor` to send back as `cursor` for the following page.
+    """
+    query = {"status": "pending"}
+    if cursor:
+        try:
+            query.update(decode_cursor(cursor))
+        except ValueError:
+            return {"status": False, "message": "Invalid cursor"}
+
+    find = col_shop.find(query, PENDING_SHOP_FIELDS).sort([("created_at", 1), ("_id", 1)])
+    if limit:
+        find = find.limit(limit)
+    shops = await find.to_list(length=None)
+
+    data = await hydrate_pending_shops(shops)
+    if limit is None:
+        return BSONJSONResponse({"status": True, "data": data})
+
+    next_cursor = encode_cursor(shops[-1]) if len(shops) == limit else None
+    return BSONJSONResponse({"status": True, "data": data, "next_cursor": next_cursor})
 
 
 @router.get("/approve_shop")
-def approve_shop(shop_id: str):
+async def approve_shop(shop_id: str):
 
     try:
         oid = ObjectId(shop_id)
@@ -68,26 +132,28 @@ def approve_shop(shop_id: str):
         return {"status": False, "message": "Invalid shop id"}
 
     # Update status ONLY
-    col_shop.update_one({"_id": oid}, {"$set": {"status": "approved"}})
+    await col_shop.update_one({"_id": oid}, {"$set": {"status": "approved"}})
+    await refresh_shop(oid)
 
     return {"status": True, "message": "Shop Approved Successfully"}
 
 @router.get("/rejected_shop")
-def rejected_shop(shop_id: str):
+async def rejected_shop(shop_id: str):
 
     try:
         oid = ObjectId(shop_id)
     except:
         return {"status": False, "message": "Invalid shop ID"}
 
-    shop = col_shop.find_one({"_id": oid})
+    shop = await col_shop.find_one({"_id": oid})
     if not shop:
         return {"status": False, "message": "Shop not found"}
 
-    col_shop.update_one(
+    await col_shop.update_one(
         {"_id": oid},
         {"$set": {"status": "rejected"}}
     )
+    await refresh_shop(oid)
 
     return {"status": True, "message": "Shop Rejected Successfully"}
 
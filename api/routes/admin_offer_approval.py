@@ -1,10 +1,12 @@
 # admin_offer_approval.py
 
-from fastapi import APIRouter, Form
-from bson import ObjectId
+from fastapi import APIRouter, Form, Query
 from datetime import datetime
+from typing import Optional
 
-from common_urldb import db
+from common_urldb import db, ensure_index
+from shop_view import refresh_shop
+from json_response import BSONJSONResponse
 
 router = APIRouter()
 
@@ -14,63 +16,118 @@ col_offers = db["offers"]
 col_user = db["user"]
 
 
+# Backs the {"offers.status": "pending"} match below (multikey)
+ensure_index("offers", [("offers.status", 1)])
+
+MAX_PAGE_SIZE = 200
+
+
+def _as_keys(field):
+    """[ObjectId form, raw value] of a stored id, so `$lookup` can match either."""
+    return [
+        {"$convert": {"input": field, "to": "objectId", "onError": None, "onNull": None}},
+        field
+    ]
+
+
+def _first(field, default):
+    return {"$ifNull": [{"$arrayElemAt": [field, 0]}, default]}
+
+
+def _offer_field(name):
+    return {"$ifNull": [f"$offer.{name}", None]}
+
+
+def pending_offers_pipeline(skip=0, limit=None):
+    """
+    One aggregation for the moderation queue.
+
+    Only offers documents holding a pending item are matched, only the
+    pending items are unwound, and shop names and owner contacts are joined
+    on `_id` for the requested page alone. The joins are plain
+    localField/foreignField lookups (no sub-pipeline, which needs MongoDB
+    5.0); the following `$project` keeps only the joined fields it needs.
+    """
+    pipeline = [
+        {"$match": {"offers.status": "pending"}},
+        # Sorting whole documents here can use the _id index; $unwind keeps
+        # both document and array order, so no sort is needed after it
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "shop_id": 1,
+            "user_id": 1,
+            "offers": {"$filter": {
+                "input": "$offers",
+                "as": "o",
+                "cond": {"$eq": ["$$o.status", "pending"]}
+            }}
+        }},
+        {"$unwind": "$offers"},
+        {"$skip": skip},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+
+    pipeline += [
+        {"$addFields": {"shop_keys": _as_keys("$shop_id"), "user_keys": _as_keys("$user_id")}},
+        {"$lookup": {
+            "from": col_shop.name,
+            "localField": "shop_keys",
+            "foreignField": "_id",
+            "as": "shop"
+        }},
+        {"$lookup": {
+            "from": col_user.name,
+            "localField": "user_keys",
+            "foreignField": "_id",
+            "as": "user"
+        }},
+        {"$project": {
+            "_id": 0,
+            "offer": "$offers",
+            "shop_name": _first("$shop.shop_name", "Unknown Shop"),
+            "owner_phone": _first("$user.phonenumber", "-"),
+            "owner_email": _first("$user.email", "-")
+        }},
+        {"$project": {
+            "_id": _offer_field("offer_id"),
+            "media_type": _offer_field("media_type"),
+            "media_path": _offer_field("media_path"),
+            "thumb_url": _offer_field("thumb_path"),
+            "shop_name": 1,
+            "owner_phone": 1,
+            "owner_email": 1,
+            "title": _offer_field("title"),
+            "fee": _offer_field("fee"),
+            "start_date": _offer_field("start_date"),
+            "end_date": _offer_field("end_date"),
+            "percentage": _offer_field("percentage"),
+            "description": _offer_field("description"),
+        }},
+    ]
+    return pipeline
+
 
 # GET ALL PENDING OFFERS
 @router.get("/pending_offers/")
-def pending_offers():
-    cursor = col_offers.find({})
-    results = []
-
-    for doc in cursor:
-        shop_id = doc.get("shop_id")
-        user_id = doc.get("user_id")
-
-        shop_name = "Unknown Shop"
-        owner_phone = "-"
-        owner_email = "-"
-
-        # SHOP
-        shop_obj = col_shop.find_one({"_id": ObjectId(shop_id)}) if ObjectId.is_valid(shop_id) else col_shop.find_one({"_id": shop_id})
-        if shop_obj:
-            shop_name = shop_obj.get("shop_name", shop_name)
-
-        # USER
-        uobj = col_user.find_one({"_id": ObjectId(user_id)}) if ObjectId.is_valid(user_id) else col_user.find_one({"_id": user_id})
-        if uobj:
-            owner_phone = uobj.get("phonenumber", "-")
-            owner_email = uobj.get("email", "-")
-
-        # OFFERS
-        for offer in doc.get("offers", []):
-            if offer.get("status") == "pending":
-                results.append({
-                    "_id": offer.get("offer_id"),
-                    "media_type": offer.get("media_type"),
-                    "media_path": offer.get("media_path"),
-                    "shop_name": shop_name,
-                    "owner_phone": owner_phone,
-                    "owner_email": owner_email,
-                    "title": offer.get("title"),
-                    "fee": offer.get("fee"),
-                    "start_date": offer.get("start_date"),
-                    "end_date": offer.get("end_date"),
-                    "percentage": offer.get("percentage"),
-                    "description": offer.get("description"),
-                })
-
-    return {"status": True, "data": results}
+async def pending_offers(
+        skip: int = Query(0, ge=0),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
+    results = await col_offers.aggregate(pending_offers_pipeline(skip, limit)).to_list(length=None)
+    return BSONJSONResponse({"status": True, "data": results})
 
 
 # APPROVE ONE OFFER
 @router.post("/approve_offer/")
-def approve_offer(offer_id: str = Form(...)):
+async def approve_offer(offer_id: str = Form(...)):
 
-    doc = col_offers.find_one({"offers.offer_id": offer_id})
+    doc = await col_offers.find_one({"offers.offer_id": offer_id})
     if not doc:
         return {"status": False, "message": "Offer not found"}
 
     # Update specific offer inside array
-    col_offers.update_one(
+    await col_offers.update_one(
         {"offers.offer_id": offer_id},
         {
             "$set": {
@@ -86,23 +143,24 @@ def approve_offer(offer_id: str = Form(...)):
 
     # First-time approval: update parent document
     if doc.get("status") != "approved":
-        col_offers.update_one(
+        await col_offers.update_one(
             {"_id": doc["_id"]},
             {"$set": {"status": "approved"}}
         )
 
+    await refresh_shop(doc.get("shop_id"))
     return {"status": True, "message": "Offer approved"}
 
 
 # REJECT ONE OFFER
 @router.post("/reject_offer/")
-def reject_offer(offer_id: str = Form(...)):
+async def reject_offer(offer_id: str = Form(...)):
 
-    doc = col_offers.find_one({"offers.offer_id": offer_id})
+    doc = await col_offers.find_one({"offers.offer_id": offer_id})
     if not doc:
         return {"status": False, "message": "Offer not found"}
 
-    col_offers.update_one(
+    await col_offers.update_one(
         {"offers.offer_id": offer_id},
         {
             "$set": {
@@ -116,4 +174,5 @@ def reject_offer(offer_id: str = Form(...)):
         array_filters=[{"item.offer_id": offer_id}]
     )
 
+    await refresh_shop(doc.get("shop_id"))
     return {"status": True, "message": "Offer Rejected Successfully"}
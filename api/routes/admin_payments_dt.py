@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Query, HTTPException
 from fastapi.responses import JSONResponse
-from common_urldb import db
+from common_urldb import db, ensure_index
+from json_response import BSONJSONResponse
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 
 router = APIRouter(tags=["Admin Payments"])
 
 col_payments = db["payments"]
 col_users = db["user"]
 
+ensure_index("payments", [("expiry_date", 1)])
+
+ACTIVE_MIN_DAYS = 3
+MAX_PAGE_SIZE = 500
+
 # -------------------------
 # STATUS CALC
 # -------------------------
@@ -29,9 +36,27 @@ def compute_status(expiry):
 # LIST ACTIVE PAYMENTS (ADMIN)
 # -------------------------
 @router.get("/admin/payments/active/")
-def get_active_payments():
+async def get_active_payments(
+        skip: int = Query(0, ge=0),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
     try:
-        payments = list(col_payments.find().sort("created_at", -1))
+        # compute_status() calls a plan active while (expiry - now).days > 2,
+        # i.e. expiry_date >= now + 3 days, so only that window is read
+        active_from = datetime.utcnow() + timedelta(days=ACTIVE_MIN_DAYS)
+        cursor = col_payments.find({"expiry_date": {"$gte": active_from}}).sort("created_at", -1).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        payments = await cursor.to_list(length=None)
+
+        user_ids = {
+            ObjectId(p["user_id"]) for p in payments
+            if ObjectId.is_valid(str(p.get("user_id")))
+        }
+        users = {}
+        if user_ids:
+            async for u in col_users.find({"_id": {"$in": list(user_ids)}}, {"email": 1, "phonenumber": 1}):
+                users[str(u["_id"])] = u
 
         data = []
 
@@ -42,19 +67,19 @@ def get_active_payments():
             if status != "active":
                 continue   # 🔥 only active
 
-            user = col_users.find_one({"_id": ObjectId(p["user_id"])})
+            user = users.get(str(p.get("user_id")))
 
             data.append({
                 "payment_id": p.get("payment_id"),
                 "plan_name": p.get("plan_name"),
                 "amount": p.get("amount"),
-                "expiry_date": expiry.isoformat() if expiry else None,
+                "expiry_date": expiry,
                 "status": status,
                 "email": user.get("email") if user else "-",
                 "phone": user.get("phonenumber") if user else "-"
             })
 
-        return {"status": True, "data": data}
+        return BSONJSONResponse({"status": True, "data": data})
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -64,18 +89,18 @@ def get_active_payments():
 # USER ALL PLANS (CLICK USER)
 # -------------------------
 @router.get("/admin/payments/user/")
-def get_user_all_plans(q: str = Query(...)):
+async def get_user_all_plans(q: str = Query(...)):
     try:
-        user = col_users.find_one({
+        user = await col_users.find_one({
             "$or": [{"email": q}, {"phonenumber": q}]
         })
 
         if not user:
             return {"status": True, "data": []}
 
-        payments = list(col_payments.find({
+        payments = await col_payments.find({
             "user_id": str(user["_id"])
-        }).sort("created_at", -1))
+        }).sort("created_at", -1).to_list(length=None)
 
         data = []
         for p in payments:
@@ -85,11 +110,11 @@ def get_user_all_plans(q: str = Query(...)):
                 "plan_name": p.get("plan_name"),
                 "amount": p.get("amount"),
                 "status": compute_status(expiry),
-                "expiry_date": expiry.isoformat() if expiry else None,
-                "created_at": p.get("created_at").isoformat() if isinstance(p.get("created_at"), datetime) else None
+                "expiry_date": expiry,
+                "created_at": p.get("created_at") if isinstance(p.get("created_at"), datetime) else None
             })
 
-        return {"status": True, "data": data}
+        return BSONJSONResponse({"status": True, "data": data})
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -99,8 +124,8 @@ def get_user_all_plans(q: str = Query(...)):
 # DELETE PAYMENT (ADMIN)
 # -------------------------
 @router.delete("/admin/payments/delete/{payment_id}")
-def delete_payment(payment_id: str):
-    res = col_payments.delete_one({"payment_id": payment_id})
+async def delete_payment(payment_id: str):
+    res = await col_payments.delete_one({"payment_id": payment_id})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Payment not found")
 
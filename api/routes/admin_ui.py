@@ -1,45 +1,46 @@
 from fastapi import APIRouter, Request
-from fastapi.templating import Jinja2Templates
+from api.config import dashboardPages
+from api.modules.page_cache import render_page
 
 router = APIRouter()
-templates = Jinja2Templates(directory="frontend/dashboard")
+templates = dashboardPages
 
 @router.get("/")
 def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return render_page(request, templates, "index.html", {"request": request})
 
 @router.get("/admin")
 def admin(request: Request):
-    return templates.TemplateResponse("admin.html", {"request": request})
+    return render_page(request, templates, "admin.html", {"request": request})
 
 @router.get("/admin/offers")
 def admin_offers(request: Request):
-    return templates.TemplateResponse("admin_offers.html", {"request": request})
+    return render_page(request, templates, "admin_offers.html", {"request": request})
 
 @router.get("/admin/payments")
 def admin_payments(request: Request):
-    return templates.TemplateResponse("admin_payments.html", {"request": request})
+    return render_page(request, templates, "admin_payments.html", {"request": request})
 
 @router.get("/admin/reviews")
 def admin_reviews(request: Request):
-    return templates.TemplateResponse("admin_reviews.html", {"request": request})
+    return render_page(request, templates, "admin_reviews.html", {"request": request})
 
 @router.get("/admin/shops")
 def all_shops(request: Request):
-    return templates.TemplateResponse("all_shop.html", {"request": request})
+    return render_page(request, templates, "all_shop.html", {"request": request})
 
 @router.get("/admin/jobs")
 def jobs(request: Request):
-    return templates.TemplateResponse("jobs.html", {"request": request})
+    return render_page(request, templates, "jobs.html", {"request": request})
 
 @router.get("/admin/history")
 def payment_history(request: Request):
-    return templates.TemplateResponse("payment_history.html", {"request": request})
+    return render_page(request, templates, "payment_history.html", {"request": request})
 
 @router.get("/admin/pending-offers")
 def pending_offers(request: Request):
-    return templates.TemplateResponse("pending_offers_page.html", {"request": request})
+    return render_page(request, templates, "pending_offers_page.html", {"request": request})
 
 @router.get("/admin/profile")
 def profile(request: Request):
-    return templates.TemplateResponse("user-profile.html", {"request": request})
+    return render_page(request, templates, "user-profile.html", {"request": request})
@@ -15,9 +15,9 @@ def serialize_review(r):
 
 
 @router.get("/reviews/all/")
-def get_reviews(shop_id: str):
+async def get_reviews(shop_id: str):
     try:
-        reviews = list(col_reviews.find({"shop_id": shop_id}))
+        reviews = await col_reviews.find({"shop_id": shop_id}).to_list(length=None)
         return {"status": True, "data": [serialize_review(r) for r in reviews]}
     except Exception as e:
         return {"status": False, "error": str(e)}
@@ -25,12 +25,12 @@ def get_reviews(shop_id: str):
 
 # DELETE REVIEW
 @router.delete("/reviews/delete/{review_id}")
-def delete_review(review_id: str):
+async def delete_review(review_id: str):
     try:
         if not ObjectId.is_valid(review_id):
             raise HTTPException(status_code=400, detail="Invalid review ID")
 
-        col_reviews.delete_one({"_id": ObjectId(review_id)})
+        await col_reviews.delete_one({"_id": ObjectId(review_id)})
         return {"status": True, "message": "Review deleted"}
 
     except Exception as e:
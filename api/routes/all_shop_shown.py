@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Form, File, UploadFile, Query, HTTPException
+from fastapi import APIRouter, Form, File, UploadFile, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
 from typing import List, Optional
 from datetime import datetime
 import os
-import uuid
 
 # --- DATABASE CONNECTION ---
-from common_urldb import db
+from common_urldb import db, ensure_index
+from ref_cache import city_cache, category_cache
+from shop_view import col_view, iter_public_shops, refresh_shop
+from autocomplete import city_index, category_index
+from json_response import BSONJSONResponse, Projection, dumps
+from versions import bump, conditional
+from media_derivatives import derive_offer_image, derive_shop_image, schedule
+from media_store import (
+    MAX_IMAGE_BYTES, MAX_VIDEO_BYTES, UploadBudget, UploadTooLarge, release_media, store_upload
+)
 
 router = APIRouter()
 
@@ -19,30 +28,34 @@ col_offers = db["offers"]
 col_jobs = db["jobs"]
 
 # --- CONSTANTS ---
-MEDIA_BASE = "media/shop"
+MAX_PAGE_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
+CITY_SEARCH_FIELDS = Projection("_id", "city_name", "district", "pincode", "state", rename={"_id": "id"})
+CATEGORY_SEARCH_FIELDS = Projection("_id", "name", rename={"_id": "id"})
 
-# --- HELPER FUNCTIONS ---
-
-def oid(x):
-    """Safely converts ObjectId to string."""
-    if isinstance(x, ObjectId):
-        return str(x)
-    return x
+# Fields `/jobs/all/?fields=` may ask for
+JOB_FIELDS = {
+    "user_id", "job_title", "job_description", "address", "salary", "work_start_time",
+    "work_end_time", "gender", "experience", "city_id", "city_name", "created_at", "updated_at"
+}
 
+# Equality filters first, then the (created_at, _id) sort, then the salary range
+ensure_index("jobs", [("created_at", -1), ("_id", -1)])
+ensure_index("jobs", [("city_id", 1), ("created_at", -1), ("_id", -1), ("salary", 1)])
+ensure_index("jobs", [("city_id", 1), ("gender", 1), ("experience", 1), ("created_at", -1), ("_id", -1), ("salary", 1)])
+# Gender and experience without a city. Gender alone uses this index's prefix
+# but sorts in memory; experience alone filters on the (created_at, _id) scan
+ensure_index("jobs", [("gender", 1), ("experience", 1), ("created_at", -1), ("_id", -1), ("salary", 1)])
 
-def serialize_date(d):
-    """Safely converts datetime to ISO string."""
-    if isinstance(d, datetime):
-        return d.isoformat()
-    return d
 
+# --- HELPER FUNCTIONS ---
 
-def find_user_by_phone_or_email(value: str):
+async def find_user_by_phone_or_email(value: str):
     """Finds user by email or phone number to link CRUD operations."""
     if "@" in value:
-        return col_user.find_one({"email": value})
-    return col_user.find_one({"phonenumber": value})
+        return await col_user.find_one({"email": value})
+    return await col_user.find_one({"phonenumber": value})
 
 
 # ==============================================================================
@@ -50,165 +63,94 @@ def find_user_by_phone_or_email(value: str):
 # ==============================================================================
 
 @router.get("/city/search/")
-def search_city(city_name: str = Query(...)):
-    """Search cities by name (Case Insensitive)"""
+async def search_city(city_name: str = Query(...)):
+    """Autocomplete cities by name, district or pincode prefix (Case Insensitive)"""
     try:
-        # Regex search for partial match
-        query = {"city_name": {"$regex": city_name, "$options": "i"}}
-        cities = list(col_city.find(query).limit(10))
-
-        result = []
-        for c in cities:
-            result.append({
-                "id": str(c["_id"]),
-                "city_name": c.get("city_name"),
-                "district": c.get("district"),
-                "pincode": c.get("pincode"),
-                "state": c.get("state")
-            })
-        return {"status": True, "data": result}
+        cities = await city_index.search(city_name, limit=10)
+        data = [CITY_SEARCH_FIELDS.apply(c) for c in cities]
+        return BSONJSONResponse({"status": True, "data": data})
     except Exception as e:
         return {"status": False, "message": str(e)}
 
 
 @router.get("/category/search/")
-def search_category(category: str = Query(...)):
-    """Search categories by name"""
+async def search_category(category: str = Query(...)):
+    """Autocomplete categories by name prefix"""
     try:
-        query = {"name": {"$regex": category, "$options": "i"}}
-        cats = list(col_category.find(query).limit(10))
-
-        result = []
-        for c in cats:
-            result.append({
-                "id": str(c["_id"]),
-                "name": c.get("name")
-            })
-        return {"status": True, "data": result}
+        cats = await category_index.search(category, limit=10)
+        data = [CATEGORY_SEARCH_FIELDS.apply(c) for c in cats]
+        return BSONJSONResponse({"status": True, "data": data})
     except Exception as e:
         return {"status": False, "message": str(e)}
 
 
+@router.get("/admin/cache/stats/")
+async def reference_cache_stats():
+    """Hit rates and sizes of the city and category caches."""
+    return {"status": True, "data": {"city": city_cache.stats(), "category": category_cache.stats()}}
+
+
 # ==============================================================================
 # 1. GET ALL SHOPS (Detailed Public View)
 # ==============================================================================
 
 
+async def iter_ndjson(items):
+    """Encodes each item as one line of newline-delimited JSON."""
+    async for item in items:
+        yield dumps(item) + b"\n"
+
+
 @router.get("/shops/all/")
-def get_all_shops():
-    shops = list(col_shop.find({"status": "approved"}))
-    result = []
-
-    for s in shops:
-        sid_str = str(s["_id"])
-
-        # ---------------- CITY ----------------
-        city_doc = None
-        city_id_raw = s.get("city_id")
-        if city_id_raw and ObjectId.is_valid(str(city_id_raw)):
-            c = col_city.find_one({"_id": ObjectId(str(city_id_raw))})
-            if c:
-                city_doc = {
-                    "id": str(c["_id"]),
-                    "city_name": c.get("city_name"),
-                    "district": c.get("district"),
-                    "pincode": c.get("pincode"),
-                    "state": c.get("state")
-                }
-
-        # ---------------- USER ----------------
-        user_doc = None
-        user_id_raw = s.get("user_id")
-        try:
-            if isinstance(user_id_raw, dict) and "$oid" in user_id_raw:
-                uid = ObjectId(user_id_raw["$oid"])
-            elif ObjectId.is_valid(str(user_id_raw)):
-                uid = ObjectId(str(user_id_raw))
-            else:
-                uid = None
-
-            if uid:
-                u = col_user.find_one({"_id": uid})
-                if u:
-                    user_doc = {
-                        "id": str(u["_id"]),
-                        "name": f"{u.get('firstname','')} {u.get('lastname','')}".strip(),
-                        "phonenumber": u.get("phonenumber")
-                    }
-        except:
-            pass
-
-        # ---------------- CATEGORIES ----------------
-        category_list = []
-        cat_ids = [
-            ObjectId(c) for c in s.get("category", [])
-            if ObjectId.is_valid(str(c))
-        ]
-        if cat_ids:
-            for c in col_category.find({"_id": {"$in": cat_ids}}):
-                category_list.append({
-                    "id": str(c["_id"]),
-                    "name": c.get("name")
-                })
-
-        # ---------------- IMAGES (NORMALIZED) ----------------
-        images_list = []
-
-        # Main image
-        if s.get("main_image"):
-            images_list.append({
-                "type": "main",
-                "url": s["main_image"]   # media/shop/<shop_id>/main/<file>
-            })
-
-        # Gallery images
-        for m in s.get("media", []):
-            if isinstance(m, dict) and m.get("path"):
-                images_list.append({
-                    "type": m.get("type", "image"),
-                    "url": m["path"]       # media/shop/<shop_id>/images/<file>
-                })
-
-        # ---------------- OFFERS ----------------
-        offer_list = []
-        offer_doc = col_offers.find_one({"shop_id": sid_str})
-        if offer_doc:
-            for item in offer_doc.get("offers", []):
-                if item.get("status") == "approved":
-                    offer_list.append({
-                        "offer_id": item.get("offer_id"),
-                        "title": item.get("title"),
-                        "description": item.get("description"),
-                        "percentage": item.get("percentage"),
-                        "start_date": item.get("start_date"),
-                        "end_date": item.get("end_date"),
-                        "fee": item.get("fee"),
-                        "image_url": item.get("media_path")
-                    })
-
-        # ---------------- FINAL OBJECT ----------------
-        result.append({
-            "shop_id": sid_str,
-            "shop_name": s.get("shop_name"),
-            "description": s.get("description"),
-            "address": s.get("address"),
-            "phone_number": s.get("phone_number"),
-            "email": s.get("email"),
-            "landmark": s.get("landmark"),
-            "keywords": s.get("keywords", []),
-            "city": city_doc,
-            "user": user_doc,
-            "categories": category_list,
-            "images": images_list,
-            "offers": offer_list
-        })
+async def get_all_shops(
+        request: Request,
+        after: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: Optional[str] = Query(None)
+):
+    """
+    Lists approved shops from the `shop_public_view` collection.
+
+    Without `after`/`limit` the whole listing is returned as before. Passing
+    `limit` (and `after=<shop_id>` for the next page) switches to keyset
+    pagination ordered by `_id`. Sending `Accept: application/x-ndjson` or
+    `?format=ndjson` streams one shop per line instead of one JSON body.
+
+    Responses carry an ETag derived from the view's version; a matching
+    `If-None-Match` gets a 304 without reading the view.
+    """
+    ndjson = format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+    not_modified, headers = conditional(request, "shop_view", variant="ndjson" if ndjson else "")
+    if not_modified:
+        return not_modified
+
+    if after is None and limit is None and not ndjson:
+        # Natural order is not guaranteed once documents move; keep the `_id` order of the old listing
+        data = await col_view.find({}, {"_id": 0}).sort("_id", 1).to_list(length=None)
+        return BSONJSONResponse({"status": True, "data": data}, headers=headers)
+
+    query = {}
+    if after:
+        if not ObjectId.is_valid(after):
+            return {"status": False, "message": "Invalid cursor"}
+        query["_id"] = {"$gt": ObjectId(after)}
+
+    if ndjson:
+        return StreamingResponse(
+            iter_ndjson(iter_public_shops(query, limit)),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers
+        )
 
-    return {"status": True, "data": result}
+    data = [s async for s in iter_public_shops(query, limit)]
+    next_after = data[-1]["shop_id"] if len(data) == limit else None
+    return BSONJSONResponse({"status": True, "data": data, "next_after": next_after}, headers=headers)
 
 
 
 @router.post("/add_shop_custom/")
-def add_shop_custom(
+async def add_shop_custom(
         phoneid: str = Form(...),
         shop_name: str = Form(...),
         description: str = Form(...),
@@ -226,30 +168,28 @@ def add_shop_custom(
         pincode: str = Form(None)
 ):
     # 1. Validate User
-    user = find_user_by_phone_or_email(phoneid)
+    user = await find_user_by_phone_or_email(phoneid)
     if not user:
         return {"status": False, "message": "User not found"}
     user_id = str(user["_id"])
 
     # 2. RESOLVE CITY NAME TO CITY ID
-    city_doc = col_city.find_one({"city_name": {"$regex": f"^{city_name.strip()}$", "$options": "i"}})
+    city_doc = await city_cache.get_by_name(city_name)
 
     if city_doc:
         city_id = str(city_doc["_id"])
     else:
         return {"status": False, "message": f"City '{city_name}' not found. Please use suggestions."}
 
-    # 3. Process Categories
-    cat_ids = []
-    for raw in category_list.split(","):
-        name = raw.strip()
-        if not name: continue
-        cat = col_category.find_one({"name": {"$regex": f"^{name}$", "$options": "i"}})
-        if cat:
-            cat_ids.append(str(cat["_id"]))
+    # 3. Resolve all category names in one go
+    names = [raw.strip() for raw in category_list.split(",") if raw.strip()]
+    cats, unknown = await category_cache.get_many_by_name(names)
+    if unknown:
+        return {"status": False, "message": f"Categories not found: {', '.join(unknown)}. Please use suggestions."}
+    cat_ids = [str(cats[name.lower()]["_id"]) for name in names]
 
     # 4. Insert Shop
-    insert_res = col_shop.insert_one({
+    insert_res = await col_shop.insert_one({
         "shop_name": shop_name,
         "description": description,
         "address": address,
@@ -270,43 +210,43 @@ def add_shop_custom(
 
     # 5. Handle Images
     update_data = {}
-
-    # Main Image
-    if main_image:
-        main_dir = os.path.join(MEDIA_BASE, shop_id, "main")
-        os.makedirs(main_dir, exist_ok=True)
-        ext = main_image.filename.split(".")[-1]
-        fname = f"{uuid.uuid4()}.{ext}"
-        path = os.path.join(main_dir, fname)
-        with open(path, "wb") as f:
-            f.write(main_image.file.read())
-        update_data["main_image"] = f"{MEDIA_BASE}/{shop_id}/main/{fname}"
-
-    # Gallery Images
     media_list = []
-    if photos:
-        img_dir = os.path.join(MEDIA_BASE, shop_id, "images")
-        os.makedirs(img_dir, exist_ok=True)
-        for p in photos:
-            if p.content_type.startswith("image"):
-                ext = p.filename.split(".")[-1]
-                fname = f"{uuid.uuid4()}.{ext}"
-                path = os.path.join(img_dir, fname)
-                with open(path, "wb") as f:
-                    f.write(p.file.read())
-                media_list.append({"type": "image", "path": f"{MEDIA_BASE}/{shop_id}/images/{fname}"})
+    budget = UploadBudget()
+
+    try:
+        # Main Image
+        if main_image:
+            update_data["main_image"] = await store_upload(main_image, MAX_IMAGE_BYTES, budget)
+
+        # Gallery Images
+        if photos:
+            for p in photos:
+                if p.content_type.startswith("image"):
+                    path = await store_upload(p, MAX_IMAGE_BYTES, budget)
+                    media_list.append({"type": "image", "path": path})
+    except UploadTooLarge as e:
+        await col_shop.delete_one({"_id": ObjectId(shop_id)})
+        for path in [update_data.get("main_image")] + [m["path"] for m in media_list]:
+            await release_media(path)
+        return {"status": False, "message": str(e)}
 
     if media_list:
         update_data["media"] = media_list
 
     if update_data:
-        col_shop.update_one({"_id": ObjectId(shop_id)}, {"$set": update_data})
+        await col_shop.update_one({"_id": ObjectId(shop_id)}, {"$set": update_data})
+
+    # Thumbnails and WebP variants are built in the background
+    if update_data.get("main_image"):
+        schedule(derive_shop_image(shop_id, update_data["main_image"]))
+    for m in media_list:
+        schedule(derive_shop_image(shop_id, m["path"]))
 
     return {"status": True, "message": "Shop added successfully", "shop_id": shop_id}
 
 
 @router.post("/update_shop/")
-def update_shop_custom(
+async def update_shop_custom(
         shop_id: str = Form(...),
         shop_name: str = Form(None),
         description: str = Form(None),
@@ -324,7 +264,7 @@ def update_shop_custom(
     except:
         return {"status": False, "message": "Invalid Shop ID"}
 
-    shop = col_shop.find_one({"_id": soid})
+    shop = await col_shop.find_one({"_id": soid})
     if not shop:
         return {"status": False, "message": "Shop not found"}
 
@@ -339,78 +279,89 @@ def update_shop_custom(
 
     # City Name Update
     if city_name:
-        city_doc = col_city.find_one({"city_name": {"$regex": f"^{city_name.strip()}$", "$options": "i"}})
+        city_doc = await city_cache.get_by_name(city_name)
         if city_doc:
             update["city_id"] = str(city_doc["_id"])
 
-    # 1. Main Image Update
-    if main_image:
-        main_dir = os.path.join(MEDIA_BASE, shop_id, "main")
-        os.makedirs(main_dir, exist_ok=True)
+    budget = UploadBudget()
+    stored = []
+    try:
+        # 1. Main Image Update
+        if main_image:
+            update["main_image"] = await store_upload(main_image, MAX_IMAGE_BYTES, budget)
+            update["main_thumb"] = None
+            update["main_webp"] = None
+            stored.append(update["main_image"])
+
+        # 2. Append new photos to existing media
+        if photos:
+            current_media = shop.get("media", [])
+
+            for p in photos:
+                if p.content_type.startswith("image"):
+                    path = await store_upload(p, MAX_IMAGE_BYTES, budget)
+                    stored.append(path)
+                    current_media.append({"type": "image", "path": path})
+
+            update["media"] = current_media
+    except UploadTooLarge as e:
+        for path in stored:
+            await release_media(path)
+        return {"status": False, "message": str(e)}
 
-        # Remove old main image
-        old_main = shop.get("main_image")
-        if old_main and os.path.exists(old_main):
-            try:
-                os.remove(old_main)
-            except:
-                pass
-
-        ext = main_image.filename.split(".")[-1]
-        fname = f"{uuid.uuid4()}.{ext}"
-        path = os.path.join(main_dir, fname)
-        with open(path, "wb") as f:
-            f.write(main_image.file.read())
-        update["main_image"] = f"{MEDIA_BASE}/{shop_id}/main/{fname}"
-
-    # 2. Append new photos to existing media
-    if photos:
-        img_dir = os.path.join(MEDIA_BASE, shop_id, "images")
-        os.makedirs(img_dir, exist_ok=True)
-        current_media = shop.get("media", [])
-
-        for p in photos:
-            if p.content_type.startswith("image"):
-                ext = p.filename.split(".")[-1]
-                fname = f"{uuid.uuid4()}.{ext}"
-                path = os.path.join(img_dir, fname)
-                with open(path, "wb") as f:
-                    f.write(p.file.read())
-                current_media.append({"type": "image", "path": f"{MEDIA_BASE}/{shop_id}/images/{fname}"})
-
-        update["media"] = current_media
+    # Drop the old main image's reference once the new one is in place
+    if main_image:
+        await release_media(shop.get("main_image"))
 
     if update:
-        col_shop.update_one({"_id": soid}, {"$set": update})
+        await col_shop.update_one({"_id": soid}, {"$set": update})
+        await refresh_shop(soid)
+
+    # Thumbnails and WebP variants for images without them are built in the background
+    new_paths = [update["main_image"]] if update.get("main_image") else []
+    new_paths += [m["path"] for m in update.get("media", []) if not m.get("thumb")]
+    for path in new_paths:
+        schedule(derive_shop_image(shop_id, path))
 
     return {"status": True, "message": "Shop updated successfully"}
 
 
 @router.delete("/shops/delete/{shop_id}")
-def delete_shop(shop_id: str):
+async def delete_shop(shop_id: str):
     try:
         oidv = ObjectId(shop_id)
     except:
         return {"status": False, "message": "Invalid shop id"}
 
-    res = col_shop.delete_one({"_id": oidv})
-    if res.deleted_count:
+    shop = await col_shop.find_one_and_delete({"_id": oidv})
+    if shop:
+        # Release the shop's media and that of its offers
+        paths = [shop.get("main_image")] + [
+            m.get("path") for m in shop.get("media", []) if isinstance(m, dict)
+        ]
+        async for doc in col_offers.find({"shop_id": shop_id}, {"offers.media_path": 1}):
+            paths += [item.get("media_path") for item in doc.get("offers", [])]
+        for path in paths:
+            await release_media(path)
+
         # Cascade delete (Offers and Jobs)
-        col_offers.delete_many({"shop_id": shop_id})
-        col_jobs.delete_many({"shop_id": shop_id})
+        await col_offers.delete_many({"shop_id": shop_id})
+        await col_jobs.delete_many({"shop_id": shop_id})
+        await bump("jobs")
+        await refresh_shop(oidv)
         return {"status": True, "message": "Shop, Offers and Jobs deleted"}
 
     return {"status": False, "message": "Shop not found"}
 
 
 @router.post("/shop/photo/delete/")
-def delete_shop_photo(shop_id: str = Form(...), photo_index: int = Form(...)):
+async def delete_shop_photo(shop_id: str = Form(...), photo_index: int = Form(...)):
     try:
         soid = ObjectId(shop_id)
     except:
         return {"status": False, "message": "Invalid shop id"}
 
-    shop = col_shop.find_one({"_id": soid})
+    shop = await col_shop.find_one({"_id": soid})
     if not shop:
         return {"status": False, "message": "Shop not found"}
 
@@ -420,8 +371,11 @@ def delete_shop_photo(shop_id: str = Form(...), photo_index: int = Form(...)):
         return {"status": False, "message": "Invalid photo index"}
 
     # Remove item at index (Updates DB immediately)
-    media_list.pop(photo_index)
-    col_shop.update_one({"_id": soid}, {"$set": {"media": media_list}})
+    removed = media_list.pop(photo_index)
+    await col_shop.update_one({"_id": soid}, {"$set": {"media": media_list}})
+    if isinstance(removed, dict):
+        await release_media(removed.get("path"))
+    await refresh_shop(soid)
 
     return {"status": True, "message": "Photo deleted"}
 
@@ -442,35 +396,30 @@ async def add_offer_custom(
         description: str = Form(""),
         file: UploadFile = File(...)
 ):
-    user = find_user_by_phone_or_email(phoneid)
+    user = await find_user_by_phone_or_email(phoneid)
     if not user:
         return {"status": False, "message": "User not found"}
     user_id = str(user["_id"])
 
     if file.content_type.startswith("image"):
-        folder, media_type = "images", "image"
+        media_type, max_bytes = "image", MAX_IMAGE_BYTES
     elif file.content_type.startswith("video"):
-        folder, media_type = "videos", "video"
+        media_type, max_bytes = "video", MAX_VIDEO_BYTES
     else:
         return {"status": False, "message": "Invalid file type"}
 
     offer_id = str(ObjectId())
 
-    save_dir = os.path.join(MEDIA_BASE, target_shop, "offers", folder)
-    os.makedirs(save_dir, exist_ok=True)
-
-    ext = file.filename.split(".")[-1]
-    filename = f"{offer_id}.{ext}"
-    full_path = os.path.join(save_dir, filename)
-
-    with open(full_path, "wb") as f:
-        f.write(await file.read())
+    try:
+        media_path = await store_upload(file, max_bytes)
+    except UploadTooLarge as e:
+        return {"status": False, "message": str(e)}
 
     offer_obj = {
         "offer_id": offer_id,
         "media_type": media_type,
-        "media_path": f"{MEDIA_BASE}/{target_shop}/offers/{folder}/{filename}",
-        "filename": filename,
+        "media_path": media_path,
+        "filename": os.path.basename(media_path),
         "title": title,
         "fee": fee,
         "start_date": start_date,
@@ -481,10 +430,10 @@ async def add_offer_custom(
         "status": "pending"  # Or approved
     }
 
-    if col_offers.find_one({"shop_id": target_shop}):
-        col_offers.update_one({"shop_id": target_shop}, {"$push": {"offers": offer_obj}})
+    if await col_offers.find_one({"shop_id": target_shop}):
+        await col_offers.update_one({"shop_id": target_shop}, {"$push": {"offers": offer_obj}})
     else:
-        col_offers.insert_one({
+        await col_offers.insert_one({
             "shop_id": target_shop,
             "user_id": user_id,
             "offers": [offer_obj],
@@ -492,23 +441,30 @@ async def add_offer_custom(
             "created_at": datetime.utcnow()
         })
 
+    if media_type == "image":
+        schedule(derive_offer_image(target_shop, offer_id, offer_obj["media_path"]))
+
     return {"status": True, "message": "Offer added successfully"}
 
 
 @router.post("/delete_offer_custom/")
-def delete_offer_custom(offer_id: str = Form(...)):
+async def delete_offer_custom(offer_id: str = Form(...)):
     """Removes a specific offer object from the 'offers' array using $pull"""
     try:
         # Find document containing the offer
-        doc = col_offers.find_one({"offers.offer_id": offer_id})
+        doc = await col_offers.find_one({"offers.offer_id": offer_id})
         if not doc:
             return {"status": False, "message": "Offer not found"}
 
         # Pull from array
-        col_offers.update_one(
+        await col_offers.update_one(
             {"_id": doc["_id"]},
             {"$pull": {"offers": {"offer_id": offer_id}}}
         )
+        for item in doc.get("offers", []):
+            if item.get("offer_id") == offer_id:
+                await release_media(item.get("media_path"))
+        await refresh_shop(doc.get("shop_id"))
         return {"status": True, "message": "Offer deleted successfully"}
     except Exception as e:
         return {"status": False, "message": str(e)}
@@ -526,7 +482,7 @@ from datetime import datetime
 # router = APIRouter() # Assuming you have this
 
 @router.post("/jobs/add/")
-def add_job(
+async def add_job(
         phoneid: str = Form(...),
         job_title: str = Form(...),
         job_description: str = Form(...),
@@ -539,14 +495,14 @@ def add_job(
         experience: str = Form("Fresher")
 ):
     try:
-        user = find_user_by_phone_or_email(phoneid)
+        user = await find_user_by_phone_or_email(phoneid)
         if not user:
             return {"status": False, "message": "User not found"}
 
         if not ObjectId.is_valid(city_id):
             return {"status": False, "message": "Invalid city id"}
 
-        city = col_city.find_one({"_id": ObjectId(city_id)})
+        city = await city_cache.get(city_id)
         if not city:
             return {"status": False, "message": "City not found"}
 
@@ -566,7 +522,8 @@ def add_job(
             "updated_at": datetime.utcnow()
         }
 
-        col_jobs.insert_one(job)
+        await col_jobs.insert_one(job)
+        await bump("jobs")
         return {"status": True, "message": "Job added successfully"}
 
     except Exception as e:
@@ -578,7 +535,7 @@ from typing import Optional
 
 
 @router.post("/job/update/{job_id}/")
-def update_job(
+async def update_job(
         job_id: str,
         # phoneid: str = Form(...),  <-- CRITICAL: Ensure this is REMOVED
         job_title: str = Form(None),
@@ -598,7 +555,7 @@ def update_job(
         j_oid = ObjectId(job_id)
 
         # Check if job exists
-        job = col_jobs.find_one({"_id": j_oid})
+        job = await col_jobs.find_one({"_id": j_oid})
         if not job:
             return {"status": False, "message": "Job not found"}
 
@@ -621,60 +578,120 @@ def update_job(
         if experience: update_data["experience"] = experience
 
         if city_id and ObjectId.is_valid(city_id):
-            c_obj = col_city.find_one({"_id": ObjectId(city_id)})
+            c_obj = await city_cache.get(city_id)
             if c_obj:
                 update_data["city_id"] = ObjectId(city_id)
                 update_data["city_name"] = c_obj.get("city_name")
 
         update_data["updated_at"] = datetime.utcnow()
 
-        col_jobs.update_one({"_id": j_oid}, {"$set": update_data})
+        await col_jobs.update_one({"_id": j_oid}, {"$set": update_data})
+        await bump("jobs")
 
         return {"status": True, "message": "Job updated successfully"}
 
     except Exception as e:
         print(f"Update Error: {e}")
         return {"status": False, "message": "Failed to update job"}
+
+
+def encode_job_cursor(job):
+    """Builds the `<created_at iso>|<job id>` cursor for the jobs after `job`."""
+    created = job.get("created_at")
+    return f"{created.isoformat() if isinstance(created, datetime) else ''}|{job['_id']}"
+
+
+def decode_job_cursor(cursor):
+    """Turns `<created_at iso>|<job id>` into a query for the (older) jobs after it."""
+    created_raw, _, jid = cursor.partition("|")
+    if not ObjectId.is_valid(jid):
+        raise ValueError("Invalid cursor")
+    if not created_raw:
+        # Undated jobs sort last, so only other undated ones follow
+        return {"created_at": None, "_id": {"$lt": ObjectId(jid)}}
+    created = datetime.fromisoformat(created_raw)
+    return {"$or": [
+        {"created_at": {"$lt": created}},
+        {"created_at": created, "_id": {"$lt": ObjectId(jid)}},
+        {"created_at": None}
+    ]}
+
+
 @router.get("/jobs/all/")
-def get_all_jobs():
+async def get_all_jobs(
+        request: Request,
+        city_id: Optional[str] = Query(None),
+        salary_min: Optional[int] = Query(None, ge=0),
+        salary_max: Optional[int] = Query(None, ge=0),
+        gender: Optional[str] = Query(None),
+        experience: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None),
+        after: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Lists jobs newest first, optionally filtered by city, salary range,
+    gender and experience.
+
+    `fields=job_title,salary,...` returns only those fields (plus `_id` and
+    `created_at`).
+    Pass `limit` to page through the results; each response then carries
+    `next_after` to send back as `after` for the following page.
+    """
+    not_modified, headers = conditional(request, "jobs")
+    if not_modified:
+        return not_modified
+
+    query = {}
+    if city_id:
+        if not ObjectId.is_valid(city_id):
+            return {"status": False, "message": "Invalid city id"}
+        query["city_id"] = ObjectId(city_id)
+    if gender:
+        query["gender"] = gender
+    if experience:
+        query["experience"] = experience
+    if salary_min is not None or salary_max is not None:
+        query["salary"] = {}
+        if salary_min is not None:
+            query["salary"]["$gte"] = salary_min
+        if salary_max is not None:
+            query["salary"]["$lte"] = salary_max
+    if after:
+        try:
+            query.update(decode_job_cursor(after))
+        except ValueError:
+            return {"status": False, "message": "Invalid cursor"}
+
+    projection = None
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in JOB_FIELDS]
+        if unknown:
+            return {"status": False, "message": f"Unknown fields: {', '.join(unknown)}"}
+        # created_at is always read so the next cursor can be built
+        projection = Projection("_id", "created_at", *wanted).mongo
+
     try:
-        jobs = list(col_jobs.find().sort("created_at", -1))
-        for j in jobs:
-            j["_id"] = str(j["_id"])
-            j["user_id"] = str(j["user_id"])
-            j["city_id"] = str(j["city_id"])
-        return {"status": True, "data": jobs}
+        find = col_jobs.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+        if limit:
+            find = find.limit(limit)
+        jobs = await find.to_list(length=None)
     except Exception as e:
         print("Fetch jobs error:", e)
         return {"status": False, "message": "Failed to fetch jobs"}
 
+    if limit is None:
+        return BSONJSONResponse({"status": True, "data": jobs}, headers=headers)
 
-@router.get("/city/search/")
-def search_city(city_name: str = Query(...)):
-    """Search cities by name (Case Insensitive)"""
-    try:
-        # Regex search for partial match
-        query = {"city_name": {"$regex": city_name, "$options": "i"}}
-        cities = list(col_city.find(query).limit(10))
-
-        result = []
-        for c in cities:
-            result.append({
-                "id": str(c["_id"]),
-                "city_name": c.get("city_name"),
-                "district": c.get("district"),
-                "pincode": c.get("pincode"),
-                "state": c.get("state")
-            })
-        return {"status": True, "data": result}
-    except Exception as e:
-        return {"status": False, "message": str(e)}
-
+    next_after = encode_job_cursor(jobs[-1]) if len(jobs) == limit else None
+    return BSONJSONResponse({"status": True, "data": jobs, "next_after": next_after}, headers=headers)
 
 
 @router.delete("/jobs/delete/{job_id}")
-def delete_job(job_id: str):
+async def delete_job(job_id: str):
     if ObjectId.is_valid(job_id):
-        col_jobs.delete_one({"_id": ObjectId(job_id)})
+        await col_jobs.delete_one({"_id": ObjectId(job_id)})
+        await bump("jobs")
         return {"status": True, "message": "Deleted"}
     return {"status": False, "message": "Invalid ID"}
@@ -5,9 +5,10 @@ import logging
 from fastapi import APIRouter, Form, HTTPException, status, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from api.models.users import RegistrationForm, LoginForm
-from api.modules.db import fetch_all_users, save_user, get_user_by_email, get_user_count
-from api.modules.encryption import hash_password, verify_password
+from api.modules.db import fetch_all_users, save_user, get_user_by_email, get_user_count, update_user_password
+from api.modules.encryption import hash_password_async, verify_password_async, needs_rehash
 from api.modules.authentication import get_current_user
+from api.modules.user_cache import get_cached_user, invalidate_user, user_cache
 from api.config import authPages, setup_logging, debugStatus
 
 # Initialize logging
@@ -25,9 +26,13 @@ async def list_users(is_debug: None = Depends(is_debug_mode)):
     users = await fetch_all_users()
     return {"users": users}
 
+@session.get("/auth/users/cache-stats")
+async def user_cache_stats(is_debug: None = Depends(is_debug_mode)):
+    return {"user_cache": user_cache.stats()}
+
 @session.get("/auth/users/{email}")
 async def list_single_users(email: str, is_debug: None = Depends(is_debug_mode)):
-    user = await get_user_by_email(email)
+    user = await get_cached_user(email)
     if user:
         user.pop('password', None)
         user.pop('_id', None)
@@ -57,7 +62,7 @@ async def handle_registration(
     if not terms_and_conditions:
         raise HTTPException(status_code=400, detail="You must accept the terms and conditions")
     
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
     
     # If first user, make them admin
     user_count = await get_user_count()
@@ -79,15 +84,20 @@ async def handle_registration(
     )
 
     await save_user(form_data.dict())
+    invalidate_user(email)
     return redirect_with_status("/")
 
 @session.post("/auth/user-signin")
 async def handle_login(request: Request, email: str = Form(...), password: str = Form(...)):
     user = await get_user_by_email(email)
-    if user is None or not verify_password(password, user["password"]):
+    if user is None or not await verify_password_async(password, user["password"]):
         logging.error("Login failed")
         request.session["login_error"] = "Invalid credentials"
         return redirect_with_status("/auth/signin")
+    if needs_rehash(user["password"]):
+        # Upgrade the stored hash to the configured work factor
+        await update_user_password(user["email"], await hash_password_async(password))
+        invalidate_user(user["email"])
     logging.info("Login successful")
     request.session["user_email"] = user["email"]  # Storing user email in session
     return redirect_with_status("/")
@@ -0,0 +1,92 @@
+# autocomplete.py
+"""
+Prefix search behind `/city/search/` and `/category/search/`.
+
+Each index loads its whole collection into memory and answers from sorted
+arrays. The `invalidate_city`/`invalidate_category` hooks in ref_cache reset
+them, but no endpoint calls those hooks yet. In practice an index is
+reloaded only when AUTOCOMPLETE_TTL seconds have passed, so a new city or
+category can take that long to appear in results.
+"""
+import asyncio
+import os
+import time
+from bisect import bisect_left
+
+from common_urldb import db
+
+AUTOCOMPLETE_TTL = int(os.getenv("AUTOCOMPLETE_TTL", "600"))
+
+
+def normalize(value):
+    """Lowercases and collapses whitespace so prefixes compare consistently."""
+    return " ".join(str(value).split()).lower()
+
+
+class PrefixIndex:
+    """
+    In-memory prefix search over a small, rarely changing collection.
+
+    Every searchable field gets a sorted array of (normalized value, position)
+    pairs, so a lookup is a binary search followed by a short forward scan.
+    Results are ranked by field order (an earlier field wins), then by value,
+    which puts exact matches ahead of longer completions. The arrays are
+    rebuilt after `ttl` seconds, or sooner after `invalidate()`.
+    """
+
+    def __init__(self, collection, fields, extra_fields=(), ttl=AUTOCOMPLETE_TTL):
+        self.collection = collection
+        self.fields = fields
+        self.projection = {f: 1 for f in [*fields, *extra_fields]}
+        self.ttl = ttl
+        self._docs = []
+        self._keys = {}
+        self._expires = 0
+        self._lock = asyncio.Lock()
+
+    async def _ensure_loaded(self):
+        if self._expires > time.monotonic():
+            return
+        async with self._lock:
+            if self._expires > time.monotonic():
+                return
+
+            docs = await self.collection.find({}, self.projection).to_list(length=None)
+            keys = {}
+            for field in self.fields:
+                keys[field] = sorted(
+                    (normalize(d[field]), pos)
+                    for pos, d in enumerate(docs)
+                    if d.get(field) not in (None, "")
+                )
+
+            self._docs, self._keys = docs, keys
+            self._expires = time.monotonic() + self.ttl
+
+    async def search(self, query, limit=10):
+        """Returns up to `limit` documents with a field starting with `query`."""
+        await self._ensure_loaded()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        seen, result = set(), []
+        for field in self.fields:
+            keys = self._keys[field]
+            i = bisect_left(keys, (prefix,))
+            while i < len(keys) and keys[i][0].startswith(prefix) and len(result) < limit:
+                pos = keys[i][1]
+                if pos not in seen:
+                    seen.add(pos)
+                    result.append(self._docs[pos])
+                i += 1
+            if len(result) >= limit:
+                break
+        return result
+
+    def invalidate(self):
+        self._expires = 0
+
+
+city_index = PrefixIndex(db["city"], ["city_name", "district", "pincode"], extra_fields=["state"])
+category_index = PrefixIndex(db["category"], ["name"])
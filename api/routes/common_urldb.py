@@ -1,7 +1,68 @@
-from pymongo import MongoClient
+from contextlib import asynccontextmanager
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
 MONGO_URL = os.getenv("MONGO_URL")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "office")
 
-client = MongoClient(MONGO_URL)
-db = client["office"]
+# Pool size and timeouts (milliseconds) for the shared client
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+# Motor does not open any connection until the first operation, which runs
+# on the app's event loop, so one client can be shared by every route module.
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
+db = client[MONGO_DB_NAME]
+
+# (collection, keys, options) for every index a route module relies on
+INDEXES = []
+
+
+# Coroutine functions the lifespan runs as background tasks
+BACKGROUND_JOBS = []
+
+
+def ensure_index(collection, keys, **options):
+    """Registers an index for the lifespan to create on startup."""
+    INDEXES.append((collection, keys, options))
+
+
+def run_in_background(job):
+    """Registers a coroutine function for the lifespan to start and cancel."""
+    BACKGROUND_JOBS.append(job)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    App lifespan for the API: `FastAPI(lifespan=lifespan)`, as in main.py.
+
+    Any app that includes routers from this directory must use it. Without it
+    no registered index is created and no background job runs (ETag version
+    polling, mail queue, payment sweeper, media GC).
+
+    Opens the connection pool, creates the registered indexes and starts the
+    background jobs on startup; cancels the jobs and closes the shared client
+    on shutdown.
+    """
+    await client.admin.command("ping")
+    for collection, keys, options in INDEXES:
+        await db[collection].create_index(keys, **options)
+
+    tasks = [asyncio.create_task(job()) for job in BACKGROUND_JOBS]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    client.close()
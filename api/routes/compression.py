@@ -0,0 +1,284 @@
+# compression.py
+"""
+ASGI middleware that gzip/brotli-compresses API responses.
+
+    app.add_middleware(CompressionMiddleware)
+
+Only responses whose content type is in the allowlist and whose body is at
+least `minimum_size` bytes are compressed. Brotli is preferred when the
+client accepts it and the optional `brotli` package is installed. Streaming
+responses (e.g. the NDJSON form of `/shops/all/`) are compressed chunk by
+chunk and flushed after every chunk, so clients still receive rows as they
+are produced. Responses that already carry a Content-Encoding, partial
+content and 204/304 responses are passed through untouched.
+
+Run `python compression.py` for a size comparison on seeded listing data and
+the request latency of that listing with and without the middleware (the
+latter needs httpx).
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESS_TYPES = os.getenv(
+    "COMPRESS_TYPES",
+    "application/json,application/x-ndjson,text/html,text/plain,text/css,"
+    "text/javascript,application/javascript,image/svg+xml"
+)
+
+SKIP_STATUS = {204, 206, 304}
+
+
+def _accepted(header):
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._c = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data=b""):
+        return self._c.process(data) + self._c.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE, level=COMPRESS_LEVEL,
+                 brotli_quality=COMPRESS_BROTLI_QUALITY, content_types=COMPRESS_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        if isinstance(content_types, str):
+            content_types = content_types.split(",")
+        self.content_types = {t.strip().lower() for t in content_types if t.strip()}
+
+    def _encoder(self, scope):
+        header = b""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                header = value
+                break
+        accepted = _accepted(header.decode("latin-1"))
+        if brotli is not None and "br" in accepted:
+            return "br", lambda: _Brotli(self.brotli_quality)
+        if "gzip" in accepted:
+            return "gzip", lambda: _Gzip(self.level)
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding, make_encoder = self._encoder(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        def compressible(message):
+            if message["status"] in SKIP_STATUS:
+                return False
+            content_type = b""
+            for name, value in message.get("headers", []):
+                name = name.lower()
+                if name == b"content-encoding":
+                    return False
+                if name == b"content-type":
+                    content_type = value
+            base = content_type.decode("latin-1").split(";")[0].strip().lower()
+            return base in self.content_types
+
+        def encoded_start(length=None):
+            headers = []
+            for name, value in start.get("headers", []):
+                lname = name.lower()
+                if lname == b"content-length":
+                    continue
+                if lname == b"etag" and not value.startswith(b"W/"):
+                    value = b"W/" + value  # the bytes on the wire differ from the identity body
+                if lname == b"vary":
+                    continue
+                headers.append((name, value))
+            vary = [v for n, v in start.get("headers", []) if n.lower() == b"vary"]
+            headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+            headers.append((b"content-encoding", encoding.encode()))
+            if length is not None:
+                headers.append((b"content-length", str(length).encode()))
+            return {**start, "headers": headers}
+
+        async def wrapped_send(message):
+            nonlocal start, encoder, passthrough
+            kind = message["type"]
+
+            if kind == "http.response.start":
+                if compressible(message):
+                    start = message  # held until the first body chunk decides the framing
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if passthrough or (start is None and encoder is None):
+                await send(message)
+                return
+
+            if kind != "http.response.body":
+                # e.g. zerocopysend: nothing to compress, release the headers as they were
+                if start is not None:
+                    await send(start)
+                    start = None
+                passthrough = True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if start is not None:
+                if not more:
+                    if len(body) < self.minimum_size:
+                        await send(start)
+                        start = None
+                        passthrough = True
+                        await send(message)
+                        return
+                    data = make_encoder().finish(body)
+                    await send(encoded_start(len(data)))
+                    start = None
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                encoder = make_encoder()
+                await send(encoded_start())
+                start = None
+
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            if data or not more:
+                await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, wrapped_send)
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import time
+
+    # Seeded data shaped like a /shops/all/ page
+    random.seed(7)
+    cities = ["Chennai", "Coimbatore", "Madurai", "Salem", "Tiruchirappalli"]
+    categories = ["Grocery", "Electronics", "Clothing", "Pharmacy", "Bakery", "Hardware"]
+    shops = [{
+        "_id": f"{random.getrandbits(96):024x}",
+        "shop_name": f"Shop {i}",
+        "city": random.choice(cities),
+        "category": random.sample(categories, 2),
+        "address": f"{random.randint(1, 999)} Main Road, Ward {random.randint(1, 60)}",
+        "phone": f"9{random.randint(100000000, 999999999)}",
+        "status": "approved",
+        "main_image": f"media/blobs/{random.getrandbits(8):02x}/{random.getrandbits(8):02x}/{random.getrandbits(256):064x}.jpg",
+        "thumb_url": f"media/blobs/aa/bb/thumbs/{random.getrandbits(256):064x}.thumb.webp",
+        "created_at": f"2026-0{random.randint(1, 9)}-1{random.randint(0, 9)}T10:00:00"
+    } for i in range(2000)]
+    raw = json.dumps({"status": True, "data": shops}).encode()
+
+    # Transfer time on a slow mobile link
+    LINK_BYTES_PER_SEC = 1_500_000 / 8
+
+    def report(label, size, cpu):
+        total = cpu + size / LINK_BYTES_PER_SEC
+        print(f"{label:<14}{size:>10} bytes  {cpu * 1000:7.1f} ms cpu  {total * 1000:8.0f} ms at 1.5 Mbps")
+
+    report("identity", len(raw), 0.0)
+    for level in (1, 6, 9):
+        started = time.perf_counter()
+        out = _Gzip(level).finish(raw)
+        report(f"gzip -{level}", len(out), time.perf_counter() - started)
+    if brotli is not None:
+        for quality in (4, 6, 11):
+            started = time.perf_counter()
+            out = _Brotli(quality).finish(raw)
+            report(f"brotli q{quality}", len(out), time.perf_counter() - started)
+    else:
+        print("brotli not installed")
+
+    # End to end: the same listing served by an app with and without the
+    # middleware, timed per request (server work plus client decoding) and
+    # with the transfer time of the received bytes on the link above
+    import asyncio
+    import statistics
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("Latency comparison skipped: pip install httpx")
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+
+    async def all_shops():
+        return Response(raw, media_type="application/json")
+
+    listing = FastAPI()
+    compressed = FastAPI()
+    compressed.add_middleware(CompressionMiddleware)
+    for app in (listing, compressed):
+        app.add_api_route("/shops/all/", all_shops)
+
+    async def latency(app, accept, rounds=50):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            timings, wire = [], 0
+            for _ in range(rounds):
+                started = time.perf_counter()
+                r = await client.get("/shops/all/", headers={"Accept-Encoding": accept})
+                # httpx decodes gzip (and br with the brotli package) on .content
+                assert len(r.content) == len(raw)
+                timings.append(time.perf_counter() - started)
+                wire = int(r.headers.get("content-length", len(r.content)))
+            return statistics.median(timings), wire
+
+    async def compare():
+        print(f"\n{'/shops/all/':<24}{'bytes':>10}{'server+decode':>16}{'at 1.5 Mbps':>14}")
+        cases = [("before (no middleware)", listing, "gzip"), ("after, gzip", compressed, "gzip")]
+        if brotli is not None:
+            cases.append(("after, br", compressed, "br"))
+        for label, app, accept in cases:
+            cpu, wire = await latency(app, accept)
+            print(f"{label:<24}{wire:>10}{cpu * 1000:>13.1f} ms"
+                  f"{(cpu + wire / LINK_BYTES_PER_SEC) * 1000:>11.0f} ms")
+
+    asyncio.run(compare())
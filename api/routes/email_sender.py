@@ -0,0 +1,203 @@
+import asyncio
+import os
+import smtplib
+import time
+from email.mime.text import MIMEText
+
+# SMTP settings come from the environment (see .env.SAMPLE). Point
+# EMAIL_HOST/EMAIL_PORT at a local stand-in for testing, e.g.
+# `python -m aiosmtpd -n -l localhost:1025` with EMAIL_STARTTLS=false and no EMAIL_USER
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USER = os.getenv("EMAIL_USER", "")
+EMAIL_PASS = os.getenv("EMAIL_PASS", "")
+EMAIL_FROM = os.getenv("EMAIL_FROM", EMAIL_USER)
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "true").lower() == "true"
+# Seconds to wait on connect and each SMTP command before giving up
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "30"))
+
+# Mail queue: connections kept open, messages per batch, retries per message
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "4"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "2"))
+EMAIL_IDLE_SECONDS = float(os.getenv("EMAIL_IDLE_SECONDS", "60"))
+
+
+def build_message(to_email, subject, body):
+    msg = MIMEText(body, "html")
+    msg["Subject"] = subject
+    msg["From"] = EMAIL_FROM
+    msg["To"] = to_email
+    return msg
+
+
+def open_connection():
+    server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
+    if EMAIL_STARTTLS:
+        server.starttls()
+    if EMAIL_USER:
+        server.login(EMAIL_USER, EMAIL_PASS)
+    return server
+
+
+def send_email(to_email, subject, body):
+    server = open_connection()
+    server.send_message(build_message(to_email, subject, body))
+    server.quit()
+
+
+def _close(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+class MailQueue:
+    """
+    Sends queued emails from a small pool of persistent SMTP connections.
+
+    Each worker owns one authenticated connection, takes up to
+    EMAIL_BATCH_SIZE messages at a time and sends them on a worker thread, so
+    TLS and login are paid once per connection rather than once per email.
+    Connections idle for EMAIL_IDLE_SECONDS are closed and reopened on demand.
+    A message that fails is retried with exponential backoff, reconnecting
+    first if the server dropped the connection; permanent recipient errors
+    are not retried. Any other error drops only the message (or batch) that
+    raised it, so the workers keep running and `join` always returns.
+
+    Handlers call `enqueue_email`; `run` is the lifespan job that owns the
+    workers.
+    """
+
+    def __init__(self, pool_size=EMAIL_POOL_SIZE, batch_size=EMAIL_BATCH_SIZE):
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.send_seconds = 0.0
+        self.last_send_seconds = 0.0
+        self.max_send_seconds = 0.0
+
+    def enqueue(self, to_email, subject, body):
+        self.queue.put_nowait((to_email, subject, body, 0))
+
+    def _send_batch(self, server, batch):
+        """Sends one batch (worker thread). Returns (server, retry, done)."""
+        retry, done = [], []
+        for item in batch:
+            to_email, subject, body, attempt = item
+            started = time.perf_counter()
+            try:
+                msg = build_message(to_email, subject, body)
+            except Exception as e:
+                print("Email to", to_email, "dropped, message could not be built:", repr(e))
+                done.append(None)
+                continue
+            try:
+                if server is None:
+                    server = open_connection()
+                server.send_message(msg)
+                done.append(time.perf_counter() - started)
+            except smtplib.SMTPRecipientsRefused:
+                done.append(None)
+            except (smtplib.SMTPException, OSError):
+                if server is not None:
+                    _close(server)
+                server = None
+                retry.append((to_email, subject, body, attempt + 1))
+            except Exception as e:
+                # e.g. UnicodeEncodeError from a server without SMTPUTF8; the
+                # session may be mid-transaction, so start a fresh one
+                print("Email to", to_email, "dropped:", repr(e))
+                if server is not None:
+                    _close(server)
+                server = None
+                done.append(None)
+        return server, retry, done
+
+    async def _requeue_later(self, item):
+        await asyncio.sleep(EMAIL_RETRY_BASE_SECONDS * 2 ** (item[3] - 1))
+        self.queue.put_nowait(item)
+        self.queue.task_done()
+
+    async def _worker(self):
+        server = None
+        pending = set()
+        try:
+            while True:
+                try:
+                    timeout = EMAIL_IDLE_SECONDS if server is not None else None
+                    batch = [await asyncio.wait_for(self.queue.get(), timeout)]
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(_close, server)
+                    server = None
+                    continue
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                try:
+                    server, retry, done = await asyncio.to_thread(self._send_batch, server, batch)
+                except Exception as e:
+                    # Count the whole batch as failed so join() still returns
+                    print("Email batch of", len(batch), "dropped:", repr(e))
+                    if server is not None:
+                        await asyncio.to_thread(_close, server)
+                    server = None
+                    retry, done = [], [None] * len(batch)
+                for seconds in done:
+                    if seconds is None:
+                        self.failed += 1
+                        continue
+                    self.sent += 1
+                    self.send_seconds += seconds
+                    self.last_send_seconds = seconds
+                    self.max_send_seconds = max(self.max_send_seconds, seconds)
+                for item in retry:
+                    if item[3] > EMAIL_MAX_RETRIES:
+                        self.failed += 1
+                        print("Email to", item[0], "dropped after", EMAIL_MAX_RETRIES, "retries")
+                        self.queue.task_done()
+                        continue
+                    # marked done only once the retry is back on the queue
+                    self.retried += 1
+                    task = asyncio.create_task(self._requeue_later(item))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                for _ in done:
+                    self.queue.task_done()
+        finally:
+            for task in list(pending):
+                task.cancel()
+            if server is not None:
+                _close(server)
+
+    async def run(self):
+        """Runs the sending workers until cancelled."""
+        await asyncio.gather(*(self._worker() for _ in range(self.pool_size)))
+
+    async def join(self):
+        """Waits until every queued email has been sent or dropped."""
+        await self.queue.join()
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "avg_send_ms": round(1000 * self.send_seconds / self.sent, 2) if self.sent else 0.0,
+            "last_send_ms": round(1000 * self.last_send_seconds, 2),
+            "max_send_ms": round(1000 * self.max_send_seconds, 2)
+        }
+
+
+mail_queue = MailQueue()
+
+
+def enqueue_email(to_email, subject, body):
+    """Queues an email for the background workers and returns immediately."""
+    mail_queue.enqueue(to_email, subject, body)
@@ -0,0 +1,82 @@
+# json_response.py
+"""
+Encodes Mongo documents straight to JSON bytes with orjson.
+
+Returning `BSONJSONResponse(content)` from a route skips FastAPI's
+`jsonable_encoder` pass. ObjectId is written as its hex string, datetime as
+ISO 8601 (the same text `isoformat()` gives) and Decimal128 as a string, at
+any depth, so documents need no per-field clean-up before they are returned.
+
+`Projection` declares the fields a listing exposes once: `.mongo` is the
+projection to pass to `find`, and `.apply(doc)` picks and renames the same
+fields from documents that come from elsewhere (e.g. an in-memory index).
+
+Run `python json_response.py` to compare encoding time on 5k seeded shops.
+"""
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from starlette.responses import Response
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=_default)
+
+
+class BSONJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+class Projection:
+    def __init__(self, *fields, rename=None):
+        self.fields = fields
+        self.rename = rename or {}
+        self.mongo = {f: 1 for f in fields}
+        if "_id" not in fields:
+            self.mongo["_id"] = 0
+
+    def apply(self, doc):
+        return {self.rename.get(f, f): doc.get(f) for f in self.fields}
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import time
+    from datetime import datetime
+    from fastapi.encoders import jsonable_encoder
+
+    random.seed(7)
+    shops = [{
+        "_id": ObjectId(),
+        "shop_name": f"Shop {i}",
+        "city": {"_id": ObjectId(), "name": "Chennai"},
+        "categories": [{"_id": ObjectId(), "name": "Grocery"}, {"_id": ObjectId(), "name": "Bakery"}],
+        "user_id": ObjectId(),
+        "phone": f"9{random.randint(100000000, 999999999)}",
+        "media": [{"path": f"media/blobs/aa/bb/{random.getrandbits(256):064x}.jpg"} for _ in range(3)],
+        "created_at": datetime.utcnow(),
+        "status": "approved"
+    } for i in range(5000)]
+    content = {"status": True, "data": shops}
+
+    def clock(label, fn, rounds=5):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            out = fn()
+        print(f"{label:<42}{(time.perf_counter() - started) / rounds * 1000:8.1f} ms  {len(out)} bytes")
+
+    clock("str() ids + jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(
+        content, custom_encoder={ObjectId: str})).encode())
+    clock("BSONJSONResponse (orjson)", lambda: BSONJSONResponse(content).body)
@@ -0,0 +1,46 @@
+# main.py
+"""
+API app for the route modules in this directory: shops, offers, jobs,
+payments, moderation and uploaded media.
+
+These modules import each other by bare name (`from common_urldb import db`),
+so run the app from here:
+
+    cd api/routes && uvicorn main:app --host 0.0.0.0 --port 8001
+
+The app runs `common_urldb.lifespan`, which creates every index registered
+with `ensure_index` and runs the background jobs registered with
+`run_in_background` (version polling for ETags, the mail queue, the payment
+sweeper and the media GC). An app that mounts these routers elsewhere must be
+created with `FastAPI(lifespan=lifespan)` too, or none of that happens, and
+should add `CompressionMiddleware` as below.
+"""
+from fastapi import FastAPI
+
+from common_urldb import lifespan
+from compression import CompressionMiddleware
+import admin_approval
+import admin_offer_approval
+import admin_payments_dt
+import adminreviews
+import all_shop_shown
+import media_files
+import media_gc
+import payment_sweeper
+
+app = FastAPI(lifespan=lifespan)
+
+# gzip/brotli for the JSON listings (/shops/all/, /jobs/all/, /pending_shops/, ...)
+app.add_middleware(CompressionMiddleware)
+
+for module in (
+        all_shop_shown,
+        admin_approval,
+        admin_offer_approval,
+        admin_payments_dt,
+        adminreviews,
+        payment_sweeper,
+        media_gc,
+        media_files
+):
+    app.include_router(module.router)
@@ -0,0 +1,175 @@
+# media_derivatives.py
+"""
+Builds smaller copies of uploaded images off the request path.
+
+For every shop main image, gallery image and offer image a resized WebP
+thumbnail and a full-size WebP variant are written to a `thumbs` folder next
+to the original, e.g. `media/blobs/ab/cd/thumbs/<sha256>.thumb.webp`.
+The paths are recorded on the shop (`main_thumb`, `main_webp`,
+`media[].thumb`, `media[].webp`) or offer (`thumb_path`, `webp_path`).
+
+Run `python media_derivatives.py` to backfill existing media.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from bson import ObjectId
+
+from common_urldb import db
+from shop_view import refresh_shop
+
+col_shop = db["shop"]
+col_offers = db["offers"]
+
+THUMB_SIZE = int(os.getenv("THUMB_SIZE", "320"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", "2"))
+
+_pool = None
+_tasks = set()
+
+
+def make_derivatives(src_path):
+    """
+    Writes the thumbnail and WebP variant of one image (runs in a worker process).
+
+    Returns {"thumb": path, "webp": path}, or None when Pillow is not
+    installed or the file cannot be decoded (the error is logged).
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    directory, name = os.path.split(src_path)
+    stem = os.path.splitext(name)[0]
+    thumbs_dir = os.path.join(directory, "thumbs")
+    os.makedirs(thumbs_dir, exist_ok=True)
+
+    thumb_path = os.path.join(thumbs_dir, f"{stem}.thumb.webp")
+    webp_path = os.path.join(thumbs_dir, f"{stem}.webp")
+    result = {
+        "thumb": thumb_path.replace(os.sep, "/"),
+        "webp": webp_path.replace(os.sep, "/")
+    }
+
+    # Blobs are shared, so another shop may already have produced these
+    if os.path.exists(thumb_path) and os.path.exists(webp_path):
+        return result
+
+    try:
+        with Image.open(src_path) as img:
+            # WebP output drops EXIF, so apply the camera's orientation first
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            img.save(webp_path, "WEBP", quality=WEBP_QUALITY)
+            img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            img.save(thumb_path, "WEBP", quality=WEBP_QUALITY)
+    except (Image.DecompressionBombError, OSError, ValueError, SyntaxError, EOFError, MemoryError) as e:
+        # Corrupt, truncated or oversized uploads; the original is still served
+        logging.error(f"Failed to derive images for {src_path}: {type(e).__name__}: {e}")
+        for path in (webp_path, thumb_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+
+    return result
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the parent runs Motor's background threads
+        _pool = ProcessPoolExecutor(
+            max_workers=DERIVATIVE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def _derive(path):
+    global _pool
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await loop.run_in_executor(pool, make_derivatives, path)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        if _pool is pool:
+            _pool = None
+        raise
+
+
+async def derive_shop_image(shop_id, path):
+    """Generates derivatives for a shop's main or gallery image and records them."""
+    out = await _derive(path)
+    if not out:
+        return
+
+    soid = ObjectId(shop_id)
+    await col_shop.update_one(
+        {"_id": soid, "main_image": path},
+        {"$set": {"main_thumb": out["thumb"], "main_webp": out["webp"]}}
+    )
+    await col_shop.update_one(
+        {"_id": soid},
+        {"$set": {"media.$[m].thumb": out["thumb"], "media.$[m].webp": out["webp"]}},
+        array_filters=[{"m.path": path}]
+    )
+    await refresh_shop(soid)
+
+
+async def derive_offer_image(shop_id, offer_id, path):
+    """Generates derivatives for an offer image and records them on the offer."""
+    out = await _derive(path)
+    if not out:
+        return
+
+    await col_offers.update_one(
+        {"offers.offer_id": offer_id},
+        {"$set": {"offers.$[o].thumb_path": out["thumb"], "offers.$[o].webp_path": out["webp"]}},
+        array_filters=[{"o.offer_id": offer_id}]
+    )
+    await refresh_shop(shop_id)
+
+
+def _finished(task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        logging.error(f"Derivative job {task.get_name()} failed: {type(e).__name__}: {e}")
+
+
+def schedule(coro):
+    """Runs a derivative job in the background without holding up the response."""
+    task = asyncio.create_task(coro, name=coro.__qualname__)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+
+
+async def backfill():
+    """Generates derivatives for every image that does not have them yet."""
+    count = 0
+    async for s in col_shop.find({}, {"main_image": 1, "main_thumb": 1, "media": 1}):
+        sid = str(s["_id"])
+        if s.get("main_image") and not s.get("main_thumb"):
+            await derive_shop_image(sid, s["main_image"])
+            count += 1
+        for m in s.get("media", []):
+            if isinstance(m, dict) and m.get("path") and not m.get("thumb"):
+                await derive_shop_image(sid, m["path"])
+                count += 1
+
+    async for doc in col_offers.find({}, {"shop_id": 1, "offers": 1}):
+        for item in doc.get("offers", []):
+            if item.get("media_type") == "image" and item.get("media_path") and not item.get("thumb_path"):
+                await derive_offer_image(doc.get("shop_id"), item.get("offer_id"), item["media_path"])
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    print(f"Derivatives generated for {asyncio.run(backfill())} images")
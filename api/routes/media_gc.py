@@ -0,0 +1,172 @@
+# media_gc.py
+"""
+Finds and removes media files that no shop or offer refers to any more.
+
+References are read with two projected scans (shops and offers) plus the
+live entries of `media_blobs`, and diffed against the files under
+`media/shop` and `media/blobs`. Files younger than MEDIA_GC_GRACE_SECONDS,
+and blobs referenced within that window, are skipped so in-flight uploads
+are never touched.
+
+`GET /admin/media/gc/` returns a dry-run report. `python media_gc.py
+--delete` removes the orphans, at most MEDIA_GC_RATE files per second.
+Setting MEDIA_GC_INTERVAL (seconds) runs the deleting pass periodically in
+the app's lifespan.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+from common_urldb import db, run_in_background
+from media_store import BLOB_BASE, MEDIA_BASE
+
+router = APIRouter(tags=["Media"])
+
+col_shop = db["shop"]
+col_offers = db["offers"]
+col_blobs = db["media_blobs"]
+
+MEDIA_GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", "3600"))
+MEDIA_GC_RATE = float(os.getenv("MEDIA_GC_RATE", "20"))
+MEDIA_GC_INTERVAL = int(os.getenv("MEDIA_GC_INTERVAL", "0"))
+
+
+def _grace_cutoff():
+    return datetime.utcnow() - timedelta(seconds=MEDIA_GC_GRACE_SECONDS)
+
+
+def _with_derivatives(path):
+    """A stored path plus the thumbnail files generated next to it."""
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    return [
+        path,
+        f"{directory}/thumbs/{stem}.thumb.webp",
+        f"{directory}/thumbs/{stem}.webp"
+    ]
+
+
+async def collect_references():
+    """Returns every media path that a shop, offer or live blob record points at."""
+    refs = set()
+
+    projection = {"main_image": 1, "main_thumb": 1, "main_webp": 1, "media": 1}
+    async for s in col_shop.find({}, projection):
+        for key in ("main_image", "main_thumb", "main_webp"):
+            if s.get(key):
+                refs.update(_with_derivatives(s[key]))
+        for m in s.get("media", []):
+            if isinstance(m, dict):
+                for key in ("path", "thumb", "webp"):
+                    if m.get(key):
+                        refs.update(_with_derivatives(m[key]))
+
+    projection = {"offers.media_path": 1, "offers.thumb_path": 1, "offers.webp_path": 1}
+    async for doc in col_offers.find({}, projection):
+        for item in doc.get("offers", []):
+            for key in ("media_path", "thumb_path", "webp_path"):
+                if item.get(key):
+                    refs.update(_with_derivatives(item[key]))
+
+    # Blobs picked up by a recent upload may not be saved on a document yet
+    async for b in col_blobs.find({"last_ref_at": {"$gte": _grace_cutoff()}}, {"path": 1}):
+        refs.update(_with_derivatives(b["path"]))
+
+    return refs
+
+
+def _scan_files(grace_seconds):
+    """Lists (path, size) for media files older than the grace period."""
+    cutoff = time.time() - grace_seconds
+    found = []
+    for base in (MEDIA_BASE, BLOB_BASE):
+        for root, _, files in os.walk(base):
+            for name in files:
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                if st.st_mtime < cutoff:
+                    found.append((full.replace(os.sep, "/"), st.st_size))
+    return found
+
+
+async def find_orphans(grace_seconds=MEDIA_GC_GRACE_SECONDS):
+    refs = await collect_references()
+    files = await run_in_threadpool(_scan_files, grace_seconds)
+    return [(path, size) for path, size in files if path not in refs]
+
+
+async def run_gc(delete=False, rate=MEDIA_GC_RATE):
+    """
+    Reports orphaned media and, with `delete=True`, removes them.
+
+    Deletion is paced to `rate` files per second so a large backlog does not
+    saturate the media volume.
+    """
+    orphans = await find_orphans()
+    report = {
+        "orphans": len(orphans),
+        "bytes": sum(size for _, size in orphans),
+        "deleted": 0,
+        "files": [path for path, _ in orphans]
+    }
+    if not delete:
+        return report
+
+    for path, _ in orphans:
+        # An upload may have reused this blob since the references were read
+        if path.startswith(BLOB_BASE + "/") and await col_blobs.find_one(
+                {"path": path, "last_ref_at": {"$gte": _grace_cutoff()}}):
+            continue
+        try:
+            await run_in_threadpool(os.remove, path)
+        except OSError:
+            continue
+        if path.startswith(BLOB_BASE + "/"):
+            await col_blobs.delete_one({"path": path})
+        report["deleted"] += 1
+        if rate > 0:
+            await asyncio.sleep(1 / rate)
+    return report
+
+
+async def gc_loop():
+    while True:
+        await asyncio.sleep(MEDIA_GC_INTERVAL)
+        try:
+            report = await run_gc(delete=True)
+            print(f"Media GC removed {report['deleted']} of {report['orphans']} orphaned files")
+        except Exception as e:
+            print("Media GC error:", e)
+
+
+if MEDIA_GC_INTERVAL > 0:
+    run_in_background(gc_loop)
+
+
+@router.get("/admin/media/gc/")
+async def media_gc_report():
+    """Dry run: lists media files that would be removed."""
+    try:
+        return {"status": True, "data": await run_gc(delete=False)}
+    except Exception as e:
+        return {"status": False, "message": str(e)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove media files nothing refers to.")
+    parser.add_argument("--delete", action="store_true", help="delete orphans instead of reporting them")
+    parser.add_argument("--rate", type=float, default=MEDIA_GC_RATE, help="max deletions per second")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_gc(delete=args.delete, rate=args.rate))
+    for f in result["files"]:
+        print(f)
+    print(f"{result['orphans']} orphaned files, {result['bytes']} bytes, {result['deleted']} deleted")
@@ -0,0 +1,328 @@
+# media_store.py
+"""
+Content-addressed storage for uploaded media.
+
+Every upload is hashed while it streams to disk and stored once under
+`media/blobs/<aa>/<bb>/<sha256>`, whatever the client called the file. The
+`media_blobs` collection keeps one document per blob with a reference count
+and its path (blobs stored before paths were digest-only keep their
+extension), and the `main_image`, `media[].path` and `media_path` fields on
+shops and offers hold that path. Uploading the same banner for several shops
+or offers therefore costs one file on disk.
+
+An upload takes its reference before it checks for the file, and the last
+release moves the files aside before it deletes the record, putting them
+back if an upload took a reference in between. A blob is never deleted
+while a record points at it.
+
+Run `python media_store.py` to move files under `media/shop` that are still
+referenced by shops or offers into the blob store and rebuild the public
+shop view with the new paths.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from pymongo import ReturnDocument
+
+from fastapi.concurrency import run_in_threadpool
+
+from common_urldb import db, ensure_index
+from shop_view import rebuild_view
+
+col_blobs = db["media_blobs"]
+col_shop = db["shop"]
+col_offers = db["offers"]
+
+ensure_index("media_blobs", [("path", 1)], unique=True)
+
+# --- LOCATIONS ---
+MEDIA_BASE = "media/shop"
+BLOB_BASE = "media/blobs"
+BLOB_TMP = os.path.join(BLOB_BASE, "tmp")
+
+# --- LIMITS (bytes) ---
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", str(250 * 1024 * 1024)))
+MAX_REQUEST_UPLOAD_BYTES = int(os.getenv("MAX_REQUEST_UPLOAD_BYTES", str(300 * 1024 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadBudget:
+    """Tracks the bytes written for all files of one request."""
+
+    def __init__(self, limit=MAX_REQUEST_UPLOAD_BYTES):
+        self.limit = limit
+        self.used = 0
+
+    def spend(self, size):
+        self.used += size
+        if self.used > self.limit:
+            raise UploadTooLarge(f"Upload exceeds the {self.limit // (1024 * 1024)} MB request limit")
+
+
+def blob_path(digest):
+    return f"{BLOB_BASE}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def _write_chunk(f, hasher, chunk):
+    f.write(chunk)
+    hasher.update(chunk)
+
+
+async def _stream_to_temp(upload, max_bytes, budget):
+    """Copies an upload to a temporary file in chunks, hashing as it goes."""
+    await run_in_threadpool(os.makedirs, BLOB_TMP, exist_ok=True)
+    tmp_path = os.path.join(BLOB_TMP, f"{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        written = 0
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLarge(f"'{upload.filename}' exceeds the {max_bytes // (1024 * 1024)} MB file limit")
+            if budget:
+                budget.spend(len(chunk))
+            await run_in_threadpool(_write_chunk, f, hasher, chunk)
+        await run_in_threadpool(f.close)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        if os.path.exists(tmp_path):
+            await run_in_threadpool(os.remove, tmp_path)
+        raise
+
+    return tmp_path, hasher.hexdigest(), written
+
+
+def _place(tmp_path, final_path):
+    """Moves a finished temp file into the store, or drops it if the blob exists."""
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+        return
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+
+
+async def _add_reference(digest, size):
+    """
+    Counts one more reference to a blob, creating its record on first use.
+
+    Returns the blob's path. Call this before placing the file, so a
+    concurrent `release_media` sees the reference and keeps the blob.
+    """
+    doc = await col_blobs.find_one_and_update(
+        {"_id": digest},
+        {
+            "$inc": {"refs": 1},
+            "$set": {"last_ref_at": datetime.utcnow()},
+            "$setOnInsert": {"path": blob_path(digest), "size": size, "created_at": datetime.utcnow()}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["path"]
+
+
+async def store_upload(upload, max_bytes, budget=None):
+    """
+    Stores an upload and returns the blob path to save on the document.
+
+    The file is read in UPLOAD_CHUNK_SIZE pieces and written from a worker
+    thread, so it never sits in memory. It is renamed into place only once
+    complete. Raises UploadTooLarge (leaving nothing behind) when
+    `max_bytes` or the request budget is exceeded.
+    """
+    tmp_path, digest, size = await _stream_to_temp(upload, max_bytes, budget)
+    try:
+        path = await _add_reference(digest, size)
+    except BaseException:
+        await run_in_threadpool(os.remove, tmp_path)
+        raise
+    await run_in_threadpool(_place, tmp_path, path)
+    return path
+
+
+def _with_derivatives(path):
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    return [
+        path,
+        os.path.join(directory, "thumbs", f"{stem}.thumb.webp"),
+        os.path.join(directory, "thumbs", f"{stem}.webp")
+    ]
+
+
+def _remove_files(path):
+    for p in _with_derivatives(path):
+        if os.path.exists(p):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def _bury(path):
+    """Moves a blob and its derivatives aside; returns [(aside, original)]."""
+    os.makedirs(BLOB_TMP, exist_ok=True)
+    buried = []
+    for p in _with_derivatives(path):
+        aside = os.path.join(BLOB_TMP, f"{uuid.uuid4().hex}.dead")
+        try:
+            os.replace(p, aside)
+        except OSError:
+            continue
+        buried.append((aside, p))
+    return buried
+
+
+def _unearth(buried):
+    """Puts buried files back unless an upload has placed the blob again meanwhile."""
+    for aside, original in buried:
+        if os.path.exists(original):
+            os.remove(aside)
+        else:
+            os.replace(aside, original)
+
+
+def _drop(buried):
+    for aside, _ in buried:
+        try:
+            os.remove(aside)
+        except OSError:
+            pass
+
+
+async def release_media(path):
+    """
+    Drops one reference to a stored file, deleting it when nothing uses it.
+
+    Paths from before the blob store are not counted and are deleted
+    straight away, as the routes used to do.
+    """
+    if not path:
+        return
+
+    doc = await col_blobs.find_one_and_update(
+        {"path": path},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        if path.startswith(MEDIA_BASE + "/"):
+            await run_in_threadpool(_remove_files, path)
+        return
+
+    if doc["refs"] > 0:
+        return
+
+    # Claim the deletion so only one release handles the files
+    token = uuid.uuid4().hex
+    claimed = await col_blobs.find_one_and_update(
+        {"_id": doc["_id"], "refs": {"$lte": 0}, "deleting": None},
+        {"$set": {"deleting": token}}
+    )
+    if claimed is None:
+        return
+
+    buried = await run_in_threadpool(_bury, path)
+    res = await col_blobs.delete_one({"_id": doc["_id"], "refs": {"$lte": 0}, "deleting": token})
+    if res.deleted_count:
+        await run_in_threadpool(_drop, buried)
+    else:
+        # An upload took a reference while the files were aside
+        await run_in_threadpool(_unearth, buried)
+        await col_blobs.update_one({"_id": doc["_id"], "deleting": token}, {"$unset": {"deleting": ""}})
+
+
+# ==============================================================================
+# MIGRATION OF media/shop INTO THE BLOB STORE
+# ==============================================================================
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest(), os.path.getsize(path)
+
+
+async def adopt_file(path, moved):
+    """Moves one legacy file into the blob store and returns its blob path."""
+    if path in moved:
+        digest, size = moved[path]
+        return await _add_reference(digest, size)
+
+    if not (path and path.startswith(MEDIA_BASE + "/") and os.path.isfile(path)):
+        return path
+
+    digest, size = await run_in_threadpool(_hash_file, path)
+    new_path = await _add_reference(digest, size)
+    await run_in_threadpool(_place, path, new_path)
+    await run_in_threadpool(_remove_files, path)
+    moved[path] = (digest, size)
+    return new_path
+
+
+async def migrate():
+    """
+    Rewrites shop and offer references from `media/shop` to blob paths.
+
+    Identical files collapse into one blob. Derivative paths are cleared so
+    `python media_derivatives.py` can regenerate them for the blobs. Files
+    that no document references are left in place.
+    """
+    moved = {}
+
+    async for s in col_shop.find({}, {"main_image": 1, "media": 1}):
+        update = {}
+        if (s.get("main_image") or "").startswith(MEDIA_BASE + "/"):
+            update["main_image"] = await adopt_file(s["main_image"], moved)
+            update["main_thumb"] = None
+            update["main_webp"] = None
+
+        media = s.get("media", [])
+        if any(isinstance(m, dict) and (m.get("path") or "").startswith(MEDIA_BASE + "/") for m in media):
+            new_media = []
+            for m in media:
+                if isinstance(m, dict) and (m.get("path") or "").startswith(MEDIA_BASE + "/"):
+                    m = {"type": m.get("type", "image"), "path": await adopt_file(m["path"], moved)}
+                new_media.append(m)
+            update["media"] = new_media
+
+        if update:
+            await col_shop.update_one({"_id": s["_id"]}, {"$set": update})
+
+    async for doc in col_offers.find({}, {"offers": 1}):
+        offers = doc.get("offers", [])
+        changed = False
+        for item in offers:
+            if (item.get("media_path") or "").startswith(MEDIA_BASE + "/"):
+                item["media_path"] = await adopt_file(item["media_path"], moved)
+                item["filename"] = os.path.basename(item["media_path"])
+                item.pop("thumb_path", None)
+                item.pop("webp_path", None)
+                changed = True
+        if changed:
+            await col_offers.update_one({"_id": doc["_id"]}, {"$set": {"offers": offers}})
+
+    return len(moved)
+
+
+async def _main():
+    moved = await migrate()
+    await rebuild_view()
+    return moved
+
+
+if __name__ == "__main__":
+    print(f"Moved {asyncio.run(_main())} files into {BLOB_BASE}")
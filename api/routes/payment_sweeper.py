@@ -0,0 +1,269 @@
+# payment_sweeper.py
+"""
+Keeps `payments.status` up to date and warns owners before a plan lapses.
+
+Each sweep only reads the payments whose status can have changed since the
+previous one: those whose `expiry_date` crossed the "expiring" or "expired"
+boundary between the stored high-water mark and now (both on the
+`expiry_date` index), plus payments created or updated since then. Whatever
+renews a plan by moving `expiry_date` must also set `updated_at`, or the
+stored status stays "expiring"/"expired" until the new date comes round.
+
+Every change is stored on the payment and logged in `payment_status_log`.
+A move to "expiring" is logged with `notify_pending`, which is cleared only
+once the owner's email is queued. Each sweep queues every pending notice,
+so notices from a sweep that failed after storing its changes are sent by
+the next one. The queue lives in memory, so a notice queued just before a
+restart can still be lost.
+
+The sweep runs every PAYMENT_SWEEP_INTERVAL seconds in the app's lifespan
+and can be triggered with `POST /admin/payments/sweep/`. Every worker runs
+the loop, so a sweep first takes a lease on the state document (valid for
+SWEEP_LEASE_SECONDS); workers that find it held skip that round, and each
+window is swept and mailed once. The lifespan also runs the mail queue
+workers; `GET /admin/mail/metrics/` reports its depth and send latency.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from fastapi import APIRouter
+
+from common_urldb import db, ensure_index, run_in_background
+from admin_payments_dt import ACTIVE_MIN_DAYS, compute_status
+from email_sender import enqueue_email, mail_queue
+
+router = APIRouter(tags=["Admin Payments"])
+
+col_payments = db["payments"]
+col_users = db["user"]
+col_status_log = db["payment_status_log"]
+col_state = db["sweeper_state"]
+
+ensure_index("payments", [("created_at", 1)])
+ensure_index("payments", [("updated_at", 1)])
+ensure_index("payment_status_log", [("notify_pending", 1)], partialFilterExpression={"notify_pending": True})
+ensure_index("payment_status_log", [("payment_id", 1), ("at", -1)])
+
+SWEEP_STATE_ID = "payment_expiry"
+PAYMENT_SWEEP_INTERVAL = int(os.getenv("PAYMENT_SWEEP_INTERVAL", "3600"))
+# A sweep that has not finished within the lease is assumed dead and may be retaken
+SWEEP_LEASE_SECONDS = int(os.getenv("SWEEP_LEASE_SECONDS", "900"))
+SWEEP_BATCH_SIZE = 500
+
+EXPIRING_SUBJECT = "Your plan is about to expire"
+EXPIRING_BODY = """
+<p>Hello,</p>
+<p>Your <b>{plan_name}</b> plan expires on <b>{expiry}</b>.</p>
+<p>Renew it to keep your shop and offers visible.</p>
+"""
+
+
+async def _apply(payments, now):
+    """Stores the current status of each payment and returns the transitions."""
+    updates, log, transitions = [], [], []
+    for p in payments:
+        status = compute_status(p.get("expiry_date"))
+        if status == p.get("status"):
+            continue
+        updates.append(UpdateOne(
+            {"_id": p["_id"]},
+            {"$set": {"status": status, "status_updated_at": now}}
+        ))
+        entry = {
+            "payment_id": p.get("payment_id"),
+            "user_id": p.get("user_id"),
+            "from": p.get("status"),
+            "to": status,
+            "at": now
+        }
+        transitions.append(dict(entry))
+        if status == "expiring":
+            entry["notify_pending"] = True
+        log.append(entry)
+
+    if updates:
+        # Log first: a crash in between repeats the change next sweep rather than losing its notice
+        await col_status_log.insert_many(log, ordered=False)
+        await col_payments.bulk_write(updates, ordered=False)
+    return transitions
+
+
+async def _sweep_query(query, now):
+    transitions, batch = [], []
+    projection = {"payment_id": 1, "user_id": 1, "expiry_date": 1, "status": 1}
+    async for p in col_payments.find(query, projection).batch_size(SWEEP_BATCH_SIZE):
+        batch.append(p)
+        if len(batch) == SWEEP_BATCH_SIZE:
+            transitions += await _apply(batch, now)
+            batch = []
+    if batch:
+        transitions += await _apply(batch, now)
+    return transitions
+
+
+async def notify_expiring(now):
+    """
+    Queues an email to the owner of each plan with a pending expiry notice.
+
+    Notices for plans that have expired or been renewed since are dropped
+    unsent. Returns the number of emails queued.
+    """
+    pending = await col_status_log.find(
+        {"notify_pending": True},
+        {"payment_id": 1, "user_id": 1}
+    ).to_list(length=None)
+    if not pending:
+        return 0
+
+    payments = {}
+    async for p in col_payments.find(
+            {"payment_id": {"$in": list({n["payment_id"] for n in pending})}},
+            {"payment_id": 1, "plan_name": 1, "expiry_date": 1, "status": 1}):
+        payments[p["payment_id"]] = p
+
+    user_ids = {ObjectId(n["user_id"]) for n in pending if ObjectId.is_valid(str(n["user_id"]))}
+    emails = {}
+    async for u in col_users.find({"_id": {"$in": list(user_ids)}}, {"email": 1}):
+        if u.get("email"):
+            emails[str(u["_id"])] = u["email"]
+
+    queued, seen = 0, set()
+    for n in pending:
+        p = payments.get(n["payment_id"])
+        to_email = emails.get(str(n["user_id"]))
+        if p and p.get("status") == "expiring" and to_email and n["payment_id"] not in seen:
+            seen.add(n["payment_id"])
+            expiry = p["expiry_date"].strftime("%d %b %Y") if isinstance(p["expiry_date"], datetime) else "-"
+            body = EXPIRING_BODY.format(plan_name=p.get("plan_name") or "", expiry=expiry)
+            enqueue_email(to_email, EXPIRING_SUBJECT, body)
+            queued += 1
+        # Cleared per notice, so a failure part-way leaves only the rest pending
+        await col_status_log.update_one(
+            {"_id": n["_id"]},
+            {"$unset": {"notify_pending": ""}, "$set": {"notified_at": now}}
+        )
+    return queued
+
+
+async def _take_lease(now):
+    """
+    Claims the sweeper state for one sweep.
+
+    Returns (lease token, previous state or None), or None while another
+    worker holds an unexpired lease.
+    """
+    token = uuid.uuid4().hex
+    try:
+        state = await col_state.find_one_and_update(
+            {"_id": SWEEP_STATE_ID, "$or": [
+                {"lease_until": None},
+                {"lease_until": {"$lt": now}}
+            ]},
+            {"$set": {"lease_until": now + timedelta(seconds=SWEEP_LEASE_SECONDS), "lease_owner": token}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        return None  # the document exists and its lease is held
+    return token, state
+
+
+async def sweep():
+    """
+    Runs one incremental sweep and advances the high-water mark.
+
+    The first sweep has no mark and classifies every payment once. Returns
+    None when another worker is already sweeping.
+    """
+    now = datetime.utcnow()
+    lease = await _take_lease(now)
+    if lease is None:
+        return None
+    token, state = lease
+
+    try:
+        since = (state or {}).get("high_water")
+        if since is None:
+            transitions = await _sweep_query({}, now)
+        else:
+            window = timedelta(days=ACTIVE_MIN_DAYS)
+            transitions = await _sweep_query({"$or": [
+                # left "active" since the last sweep
+                {"expiry_date": {"$gte": since + window, "$lt": now + window}},
+                # passed their expiry date since the last sweep
+                {"expiry_date": {"$gte": since, "$lt": now}},
+                # recorded or renewed since the last sweep
+                {"created_at": {"$gte": since}},
+                {"updated_at": {"$gte": since}}
+            ]}, now)
+
+        sent = await notify_expiring(now)
+    except BaseException:
+        # Give the window back; stored changes keep their pending notices
+        await col_state.update_one(
+            {"_id": SWEEP_STATE_ID, "lease_owner": token},
+            {"$set": {"lease_until": None}}
+        )
+        raise
+
+    await col_state.update_one(
+        {"_id": SWEEP_STATE_ID, "lease_owner": token},
+        {"$set": {
+            "high_water": now,
+            "lease_until": None,
+            "last_transitions": len(transitions),
+            "last_emails": sent
+        }}
+    )
+    return {"transitions": len(transitions), "emails": sent, "high_water": now.isoformat()}
+
+
+async def sweep_loop():
+    while True:
+        try:
+            await sweep()
+        except Exception as e:
+            print("Payment sweep error:", e)
+        await asyncio.sleep(PAYMENT_SWEEP_INTERVAL)
+
+
+run_in_background(mail_queue.run)
+if PAYMENT_SWEEP_INTERVAL > 0:
+    run_in_background(sweep_loop)
+
+
+@router.post("/admin/payments/sweep/")
+async def run_payment_sweep():
+    try:
+        result = await sweep()
+        if result is None:
+            return {"status": False, "message": "A sweep is already running"}
+        return {"status": True, "data": result}
+    except Exception as e:
+        return {"status": False, "message": str(e)}
+
+
+@router.get("/admin/mail/metrics/")
+async def mail_metrics():
+    return {"status": True, "data": mail_queue.metrics()}
+
+
+async def _sweep_and_send():
+    workers = asyncio.create_task(mail_queue.run())
+    result = await sweep()
+    if result is None:
+        workers.cancel()
+        return {"skipped": "a sweep is already running"}
+    await mail_queue.join()
+    workers.cancel()
+    await asyncio.gather(workers, return_exceptions=True)
+    return {**result, "mail": mail_queue.metrics()}
+
+
+if __name__ == "__main__":
+    print(asyncio.run(_sweep_and_send()))
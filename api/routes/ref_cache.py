@@ -0,0 +1,159 @@
+# ref_cache.py
+"""
+In-process caches of the city and category collections.
+
+Shop listings, shop writes, approvals and job filters resolve city and
+category references through `city_cache` and `category_cache` instead of
+querying for them each time. `GET /admin/cache/stats/` reports their hit
+rates.
+
+No route adds, edits or deletes cities or categories yet, so nothing calls
+`invalidate_city` or `invalidate_category`. Entries are refreshed only when
+they expire after REF_CACHE_TTL seconds, so an edit made directly in the
+database can take that long to show up. Endpoints that change either
+collection should call the matching hook.
+"""
+import os
+import time
+from bson import ObjectId
+
+from common_urldb import db, ensure_index
+from autocomplete import city_index, category_index
+
+REF_CACHE_TTL = int(os.getenv("REF_CACHE_TTL", "300"))
+
+# Case-insensitive comparison, so name lookups can use an index instead of /^name$/i
+NAME_COLLATION = {"locale": "en", "strength": 2}
+
+
+class RefCache:
+    """
+    Read-through cache for small reference collections (cities, categories).
+
+    Documents are kept in an id -> doc map and a lowercase name -> doc map.
+    Entries expire after `ttl` seconds. `invalidate()` drops them earlier,
+    through the hooks at the bottom of this module.
+    """
+
+    def __init__(self, collection, name_field, ttl=REF_CACHE_TTL):
+        self.collection = collection
+        self.name_field = name_field
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._by_id = {}
+        self._by_name = {}
+
+    def _store(self, doc):
+        expires = time.monotonic() + self.ttl
+        self._by_id[doc["_id"]] = (expires, doc)
+        name = doc.get(self.name_field)
+        if isinstance(name, str):
+            self._by_name[name.strip().lower()] = (expires, doc)
+
+    def _lookup(self, table, key):
+        entry = table.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    async def get_many(self, ids):
+        """Returns {ObjectId: doc} for the given ids, fetching misses in one `$in` query."""
+        found, missing = {}, []
+        for i in set(ids):
+            doc = self._lookup(self._by_id, i)
+            if doc is None:
+                missing.append(i)
+            else:
+                found[i] = doc
+
+        if missing:
+            async for doc in self.collection.find({"_id": {"$in": missing}}):
+                self._store(doc)
+                found[doc["_id"]] = doc
+        return found
+
+    async def get(self, doc_id):
+        """Returns one document by id (ObjectId or its string form), or None."""
+        if not doc_id or not ObjectId.is_valid(str(doc_id)):
+            return None
+        oidv = ObjectId(str(doc_id))
+        return (await self.get_many([oidv])).get(oidv)
+
+    async def get_many_by_name(self, names):
+        """
+        Resolves names case-insensitively, fetching misses in one `$in` query.
+
+        Returns ({lowercase name: doc}, [names that matched nothing]).
+        """
+        wanted = {}
+        for name in names:
+            key = (name or "").strip().lower()
+            if key:
+                wanted.setdefault(key, name.strip())
+
+        found, missing = {}, []
+        for key in wanted:
+            doc = self._lookup(self._by_name, key)
+            if doc is None:
+                missing.append(key)
+            else:
+                found[key] = doc
+
+        if missing:
+            query = {self.name_field: {"$in": missing}}
+            async for doc in self.collection.find(query, collation=NAME_COLLATION):
+                self._store(doc)
+                found.setdefault(doc[self.name_field].strip().lower(), doc)
+
+        unknown = [wanted[key] for key in wanted if key not in found]
+        return found, unknown
+
+    async def get_by_name(self, name):
+        """Returns the document whose name matches case-insensitively, or None."""
+        found, _ = await self.get_many_by_name([name])
+        return found.get((name or "").strip().lower())
+
+    def invalidate(self, doc_id=None):
+        """Drops one document (by id) or, with no id, the whole cache."""
+        if doc_id is None:
+            self._by_id.clear()
+            self._by_name.clear()
+            return
+
+        oidv = ObjectId(str(doc_id)) if ObjectId.is_valid(str(doc_id)) else doc_id
+        entry = self._by_id.pop(oidv, None)
+        if entry:
+            name = entry[1].get(self.name_field)
+            if isinstance(name, str):
+                self._by_name.pop(name.strip().lower(), None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._by_id)
+        }
+
+
+city_cache = RefCache(db["city"], "city_name")
+category_cache = RefCache(db["category"], "name")
+
+ensure_index("city", [("city_name", 1)], name="city_name_ci", collation=NAME_COLLATION)
+ensure_index("category", [("name", 1)], name="name_ci", collation=NAME_COLLATION)
+
+
+# --- INVALIDATION HOOKS (call from the city/category add, update and delete endpoints) ---
+
+def invalidate_city(city_id=None):
+    city_cache.invalidate(city_id)
+    city_index.invalidate()
+
+
+def invalidate_category(category_id=None):
+    category_cache.invalidate(category_id)
+    category_index.invalidate()
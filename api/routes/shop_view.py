@@ -0,0 +1,269 @@
+# shop_view.py
+"""
+Maintains `shop_public_view`, a denormalized copy of every approved shop in
+exactly the shape `/shops/all/` returns, keyed by the shop's `_id`.
+
+Write paths await `refresh_shop()` after changing a shop or its offers, so the
+listing is a single indexed scan. Every change to the view bumps its
+"shop_view" version, which `/shops/all/` turns into an ETag.
+
+The view is built on startup when it is empty (e.g. on first deploy). Run
+`python shop_view.py` to rebuild it after a restore or a bulk edit made
+outside the API.
+
+Each entry embeds its owner's name and phone number and its city and
+category names as they were at the last refresh. Nothing in the API edits
+users' names, cities or categories, so nothing re-renders the shops that
+embed them. A change made directly in the database shows up once each
+affected shop is next written, or after a rebuild.
+"""
+import asyncio
+import uuid
+from bson import ObjectId
+
+from common_urldb import db, run_in_background
+from ref_cache import city_cache, category_cache
+from versions import bump
+
+col_shop = db["shop"]
+col_user = db["user"]
+col_offers = db["offers"]
+col_view = db["shop_public_view"]
+
+VIEW_REBUILD_NAME = "shop_public_view_rebuild"
+LISTING_BATCH_SIZE = 200
+
+
+def _to_oid(value):
+    """Returns the ObjectId a stored reference points at, or None."""
+    if value and ObjectId.is_valid(str(value)):
+        return ObjectId(str(value))
+    return None
+
+
+async def build_public_shops(shops):
+    """
+    Builds the public view of the given shop documents.
+
+    City, user, category and offer references are collected across all shops
+    and resolved with one `$in` query per collection, so the number of Mongo
+    round trips stays constant no matter how many shops are passed in. Cities
+    and categories come from the reference cache and usually cost none.
+    """
+    refs = []
+    city_ids, user_ids, cat_ids, shop_ids = set(), set(), set(), []
+
+    for s in shops:
+        user_id_raw = s.get("user_id")
+        if isinstance(user_id_raw, dict) and "$oid" in user_id_raw:
+            user_id_raw = user_id_raw["$oid"]
+
+        ref = {
+            "sid": str(s["_id"]),
+            "city": _to_oid(s.get("city_id")),
+            "user": _to_oid(user_id_raw),
+            "categories": {
+                ObjectId(c) for c in s.get("category", [])
+                if ObjectId.is_valid(str(c))
+            },
+        }
+        refs.append(ref)
+
+        if ref["city"]:
+            city_ids.add(ref["city"])
+        if ref["user"]:
+            user_ids.add(ref["user"])
+        cat_ids.update(ref["categories"])
+        shop_ids.append(ref["sid"])
+
+    cities = await city_cache.get_many(city_ids)
+
+    users = {}
+    if user_ids:
+        users = {u["_id"]: u async for u in col_user.find({"_id": {"$in": list(user_ids)}})}
+
+    # `_id` order, matching what the indexed `$in` query used to return
+    categories = sorted((await category_cache.get_many(cat_ids)).values(), key=lambda c: c["_id"])
+
+    # First offers document per shop, same as find_one({"shop_id": ...})
+    offers = {}
+    if shop_ids:
+        async for doc in col_offers.find({"shop_id": {"$in": shop_ids}}):
+            offers.setdefault(doc.get("shop_id"), doc)
+
+    result = []
+    for s, ref in zip(shops, refs):
+        sid_str = ref["sid"]
+
+        # ---------------- CITY ----------------
+        city_doc = None
+        c = cities.get(ref["city"])
+        if c:
+            city_doc = {
+                "id": str(c["_id"]),
+                "city_name": c.get("city_name"),
+                "district": c.get("district"),
+                "pincode": c.get("pincode"),
+                "state": c.get("state")
+            }
+
+        # ---------------- USER ----------------
+        user_doc = None
+        u = users.get(ref["user"])
+        if u:
+            user_doc = {
+                "id": str(u["_id"]),
+                "name": f"{u.get('firstname','')} {u.get('lastname','')}".strip(),
+                "phonenumber": u.get("phonenumber")
+            }
+
+        # ---------------- CATEGORIES ----------------
+        category_list = []
+        if ref["categories"]:
+            for c in categories:
+                if c["_id"] in ref["categories"]:
+                    category_list.append({
+                        "id": str(c["_id"]),
+                        "name": c.get("name")
+                    })
+
+        # ---------------- IMAGES (NORMALIZED) ----------------
+        images_list = []
+
+        # Main image
+        if s.get("main_image"):
+            images_list.append({
+                "type": "main",
+                "url": s["main_image"],   # media/shop/<shop_id>/main/<file>
+                "thumb_url": s.get("main_thumb")
+            })
+
+        # Gallery images
+        for m in s.get("media", []):
+            if isinstance(m, dict) and m.get("path"):
+                images_list.append({
+                    "type": m.get("type", "image"),
+                    "url": m["path"],       # media/shop/<shop_id>/images/<file>
+                    "thumb_url": m.get("thumb")
+                })
+
+        # ---------------- OFFERS ----------------
+        offer_list = []
+        offer_doc = offers.get(sid_str)
+        if offer_doc:
+            for item in offer_doc.get("offers", []):
+                if item.get("status") == "approved":
+                    offer_list.append({
+                        "offer_id": item.get("offer_id"),
+                        "title": item.get("title"),
+                        "description": item.get("description"),
+                        "percentage": item.get("percentage"),
+                        "start_date": item.get("start_date"),
+                        "end_date": item.get("end_date"),
+                        "fee": item.get("fee"),
+                        "image_url": item.get("media_path"),
+                        "thumb_url": item.get("thumb_path")
+                    })
+
+        # ---------------- FINAL OBJECT ----------------
+        result.append({
+            "shop_id": sid_str,
+            "shop_name": s.get("shop_name"),
+            "description": s.get("description"),
+            "address": s.get("address"),
+            "phone_number": s.get("phone_number"),
+            "email": s.get("email"),
+            "landmark": s.get("landmark"),
+            "keywords": s.get("keywords", []),
+            "city": city_doc,
+            "user": user_doc,
+            "categories": category_list,
+            "images": images_list,
+            "offers": offer_list
+        })
+
+    return result
+
+
+def _view_doc(public):
+    """Stores the public object under the shop's ObjectId so `_id` order is kept."""
+    return {"_id": ObjectId(public["shop_id"]), **public}
+
+
+async def iter_public_shops(query, limit=None):
+    """Yields public shop objects from the view in `_id` order."""
+    cursor = col_view.find(query, {"_id": 0}).sort("_id", 1).batch_size(LISTING_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        yield doc
+
+
+async def refresh_shop(shop_id):
+    """Recomputes the view entry for one shop, removing it unless the shop is approved."""
+    soid = _to_oid(shop_id)
+    if soid is None:
+        return
+
+    shop = await col_shop.find_one({"_id": soid})
+    if shop and shop.get("status") == "approved":
+        doc = _view_doc((await build_public_shops([shop]))[0])
+        result = await col_view.replace_one({"_id": soid}, doc, upsert=True)
+        changed = result.modified_count or result.upserted_id is not None
+    else:
+        changed = (await col_view.delete_one({"_id": soid})).deleted_count
+    if changed:
+        await bump("shop_view")
+
+
+async def rebuild_view():
+    """
+    Rebuilds the whole view from the source collections.
+
+    Documents are written to a scratch collection in batches and swapped in
+    with a single rename, so readers never see a half-built view. Each
+    rebuild has its own scratch collection, so workers starting together do
+    not interfere; the last rename wins.
+    """
+    scratch = db[f"{VIEW_REBUILD_NAME}_{uuid.uuid4().hex[:12]}"]
+
+    count = 0
+    batch = []
+    try:
+        cursor = col_shop.find({"status": "approved"}).sort("_id", 1).batch_size(LISTING_BATCH_SIZE)
+        async for s in cursor:
+            batch.append(s)
+            if len(batch) == LISTING_BATCH_SIZE:
+                await scratch.insert_many([_view_doc(p) for p in await build_public_shops(batch)])
+                count += len(batch)
+                batch = []
+        if batch:
+            await scratch.insert_many([_view_doc(p) for p in await build_public_shops(batch)])
+            count += len(batch)
+
+        if count:
+            await scratch.rename(col_view.name, dropTarget=True)
+        else:
+            await col_view.delete_many({})
+    except BaseException:
+        await scratch.drop()
+        raise
+    await bump("shop_view")
+    return count
+
+
+async def build_view_if_empty():
+    """Lifespan job: builds the view once when it has no entries yet."""
+    try:
+        if await col_view.find_one({}, {"_id": 1}) is None:
+            count = await rebuild_view()
+            print(f"shop_public_view was empty, built with {count} shops")
+    except Exception as e:
+        print("Shop view build error:", e)
+
+
+run_in_background(build_view_if_empty)
+
+
+if __name__ == "__main__":
+    print(f"shop_public_view rebuilt with {asyncio.run(rebuild_view())} shops")
@@ -0,0 +1,89 @@
+# versions.py
+"""
+Per-collection change counters for conditional GETs.
+
+Write paths bump the counter of what they changed (`await bump("jobs")`).
+Read endpoints turn the counters they depend on into a weak ETag and answer
+a matching `If-None-Match` with 304 before running any query:
+
+    not_modified, headers = conditional(request, "jobs")
+    if not_modified:
+        return not_modified
+    ...
+    return BSONJSONResponse(content, headers=headers)
+
+Counters live in the `collection_versions` collection so every worker sees
+every bump. Each worker keeps them in memory and re-reads them every
+VERSION_POLL_SECONDS in the app's lifespan; its own bumps apply at once.
+Until the first read completes no ETag is issued.
+"""
+import asyncio
+import os
+
+from pymongo import ReturnDocument
+from starlette.responses import Response
+
+from common_urldb import db, run_in_background
+
+col_versions = db["collection_versions"]
+
+VERSION_POLL_SECONDS = float(os.getenv("VERSION_POLL_SECONDS", "1"))
+
+_versions = {}
+_loaded = False
+
+
+async def load_versions():
+    global _loaded
+    async for doc in col_versions.find({}):
+        _versions[doc["_id"]] = max(_versions.get(doc["_id"], 0), doc.get("v", 0))
+    _loaded = True
+
+
+async def bump(*names):
+    """Records a change to each named collection."""
+    for name in names:
+        doc = await col_versions.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"v": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        _versions[name] = max(_versions.get(name, 0), doc["v"])
+
+
+def etag_for(*names, variant=""):
+    if not _loaded:
+        return None
+    tag = ".".join(str(_versions.get(name, 0)) for name in names)
+    return f'W/"{tag}{"-" + variant if variant else ""}"'
+
+
+def conditional(request, *names, variant=""):
+    """
+    Returns (304 response or None, headers for the full response).
+
+    `variant` separates representations served from the same URL (e.g. NDJSON).
+    """
+    etag = etag_for(*names, variant=variant)
+    if etag is None:
+        return None, None
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    candidates = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    # Weak comparison: a strong-looking tag from an intermediary still matches
+    if etag in candidates or etag[2:] in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
+
+
+async def poll_versions():
+    while True:
+        try:
+            await load_versions()
+        except Exception as e:
+            print("Version poll error:", e)
+        await asyncio.sleep(VERSION_POLL_SECONDS)
+
+
+run_in_background(poll_versions)
@@ -0,0 +1,154 @@
+# conftest.py
+"""
+Fixtures for the route modules in api/routes.
+
+Those modules import each other by bare name, so their directory is put on
+`sys.path`. `stub_db` swaps `common_urldb` (Motor) and `versions` for
+in-memory stand-ins whose collections count every command they receive, so
+the tests need no MongoDB server.
+"""
+import os
+import sys
+import types
+from collections import Counter
+
+import pytest
+
+ROUTES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "routes")
+sys.path.insert(0, ROUTES_DIR)
+
+# Modules that bind the stubbed db or versions at import time
+STUBBED_IMPORTERS = (
+    "autocomplete", "ref_cache", "shop_view", "media_store", "media_derivatives", "all_shop_shown"
+)
+
+
+def _matches(doc, query):
+    for field, cond in (query or {}).items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$gt" in cond and not (value is not None and value > cond["$gt"]):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if projection and projection.get("_id") == 0 and len(projection) == 1:
+        return {k: v for k, v in doc.items() if k != "_id"}
+    return dict(doc)
+
+
+class StubCursor:
+    def __init__(self, docs, projection):
+        self._docs = docs
+        self._projection = projection
+        self._limit = None
+
+    def sort(self, key, direction=1):
+        self._docs = sorted(self._docs, key=lambda d: d.get(key), reverse=direction < 0)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _results(self):
+        docs = self._docs[:self._limit] if self._limit else self._docs
+        return [_project(d, self._projection) for d in docs]
+
+    async def to_list(self, length=None):
+        return self._results()
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class StubCollection:
+    """A list of documents that records one count per command sent to it."""
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.docs = []
+        self._counts = counts
+
+    def _count(self, command):
+        self._counts[(self.name, command)] += 1
+
+    def find(self, query=None, projection=None, **kwargs):
+        self._count("find")
+        return StubCursor([d for d in self.docs if _matches(d, query)], projection)
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        self._count("find_one")
+        return next((dict(d) for d in self.docs if _matches(d, query)), None)
+
+    async def replace_one(self, query, doc, upsert=False):
+        self._count("replace_one")
+        for i, d in enumerate(self.docs):
+            if _matches(d, query):
+                changed = d != doc
+                self.docs[i] = dict(doc)
+                return types.SimpleNamespace(modified_count=int(changed), upserted_id=None)
+        self.docs.append(dict(doc))
+        return types.SimpleNamespace(modified_count=0, upserted_id=doc.get("_id"))
+
+    async def delete_one(self, query):
+        self._count("delete_one")
+        for i, d in enumerate(self.docs):
+            if _matches(d, query):
+                del self.docs[i]
+                return types.SimpleNamespace(deleted_count=1)
+        return types.SimpleNamespace(deleted_count=0)
+
+
+class StubDB(dict):
+    def __init__(self):
+        super().__init__()
+        self.commands = Counter()
+
+    def __missing__(self, name):
+        self[name] = StubCollection(name, self.commands)
+        return self[name]
+
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    """Installs the stubs and yields the db; import route modules inside the test."""
+    db = StubDB()
+
+    urldb = types.ModuleType("common_urldb")
+    urldb.db = db
+    urldb.ensure_index = lambda *args, **kwargs: None
+    urldb.run_in_background = lambda job: job
+
+    versions = types.ModuleType("versions")
+
+    async def bump(*names):
+        pass
+
+    versions.bump = bump
+    versions.conditional = lambda request, *names, variant="": (None, None)
+
+    monkeypatch.setitem(sys.modules, "common_urldb", urldb)
+    monkeypatch.setitem(sys.modules, "versions", versions)
+    for name in STUBBED_IMPORTERS:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    yield db
+
+    for name in STUBBED_IMPORTERS:
+        sys.modules.pop(name, None)
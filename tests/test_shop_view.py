@@ -0,0 +1,118 @@
+# test_shop_view.py
+"""
+Checks that the shop listing costs the same number of Mongo commands however
+many shops there are: building the public view, refreshing one shop, and
+serving `/shops/all/` itself.
+"""
+import asyncio
+import importlib
+import types
+
+import pytest
+
+bson = pytest.importorskip("bson")
+ObjectId = bson.ObjectId
+
+
+def seed(db, count):
+    """Gives every shop its own city, owner, two categories and an offers document."""
+    shops = []
+    for i in range(count):
+        city = {"_id": ObjectId(), "city_name": f"City {i}"}
+        user = {"_id": ObjectId(), "firstname": "Owner", "lastname": str(i)}
+        cats = [{"_id": ObjectId(), "name": f"Category {i}.{j}"} for j in range(2)]
+        shop = {
+            "_id": ObjectId(),
+            "shop_name": f"Shop {i}",
+            "city_id": str(city["_id"]),
+            "user_id": str(user["_id"]),
+            "category": [str(c["_id"]) for c in cats],
+            "status": "approved"
+        }
+        db["city"].docs.append(city)
+        db["user"].docs.append(user)
+        db["category"].docs.extend(cats)
+        db["shop"].docs.append(shop)
+        db["offers"].docs.append({
+            "_id": ObjectId(),
+            "shop_id": str(shop["_id"]),
+            "offers": [{"offer_id": f"o{i}", "title": "Sale", "status": "approved"}]
+        })
+        shops.append(shop)
+    return shops
+
+
+def commands(db):
+    counts = dict(db.commands)
+    db.commands.clear()
+    return counts
+
+
+@pytest.mark.parametrize("count", [1, 10, 250])
+def test_build_query_count_does_not_grow_with_shops(stub_db, count):
+    shop_view = importlib.import_module("shop_view")
+    shops = seed(stub_db, count)
+
+    result = asyncio.run(shop_view.build_public_shops(shops))
+
+    assert len(result) == count
+    assert all(r["city"] and r["user"] and len(r["categories"]) == 2 and r["offers"] for r in result)
+    # One `$in` query per referenced collection, whatever the shop count
+    assert commands(stub_db) == {
+        ("city", "find"): 1, ("category", "find"): 1, ("user", "find"): 1, ("offers", "find"): 1
+    }
+
+
+def test_cached_references_cost_no_queries(stub_db):
+    shop_view = importlib.import_module("shop_view")
+    shops = seed(stub_db, 50)
+    asyncio.run(shop_view.build_public_shops(shops))
+    commands(stub_db)
+
+    asyncio.run(shop_view.build_public_shops(shops))
+
+    assert commands(stub_db) == {("user", "find"): 1, ("offers", "find"): 1}
+
+
+def test_refresh_shop_costs_a_fixed_number_of_commands(stub_db):
+    shop_view = importlib.import_module("shop_view")
+    shops = seed(stub_db, 20)
+
+    async def refresh_all():
+        per_shop = []
+        for s in shops:
+            await shop_view.refresh_shop(s["_id"])
+            per_shop.append(commands(stub_db))
+        return per_shop
+
+    per_shop = asyncio.run(refresh_all())
+
+    assert len(stub_db["shop_public_view"].docs) == 20
+    # Cities and categories are per shop here, so every refresh misses the cache
+    assert all(c == per_shop[0] for c in per_shop)
+    assert per_shop[0] == {
+        ("shop", "find_one"): 1, ("city", "find"): 1, ("category", "find"): 1,
+        ("user", "find"): 1, ("offers", "find"): 1, ("shop_public_view", "replace_one"): 1
+    }
+
+
+@pytest.mark.parametrize("count", [1, 10, 250])
+def test_shops_all_handler_reads_only_the_view(stub_db, count):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("orjson")
+    shop_view = importlib.import_module("shop_view")
+    all_shop_shown = importlib.import_module("all_shop_shown")
+    shops = seed(stub_db, count)
+
+    async def serve():
+        for s in shops:
+            await shop_view.refresh_shop(s["_id"])
+        commands(stub_db)
+        request = types.SimpleNamespace(headers={})
+        return await all_shop_shown.get_all_shops(request, after=None, limit=None, format=None)
+
+    response = asyncio.run(serve())
+
+    assert response.status_code == 200
+    assert response.body.count(b'"shop_id"') == count
+    assert commands(stub_db) == {("shop_public_view", "find"): 1}